@@ -0,0 +1,101 @@
+"""Batching benchmark: upscale throughput on a sprite-sheet style dataset, one image per pass vs. bucketed batches.
+
+Run from the backend directory (needs torch and an upscale model):
+    python benchmarks/bench_batching.py --model path/to/4x_model.pth --count 256 --size 64 --batch-sizes 1 8 32
+    python benchmarks/bench_batching.py --model path/to/model.safetensors --input path/to/sprites
+
+Without --input, --count random sprites of a few fixed sizes are generated.
+Every batch size runs the full upscale_images pipeline, encode and write included.
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_sprites(folder: Path, count: int, size: int):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    #A few sizes, like sprite sheets cut at different grid sizes
+    shapes = [(size, size), (size // 2, size // 2), (size, size // 2)]
+    for idx in range(count):
+        height, width = shapes[idx % len(shapes)]
+        pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(folder / f"sprite_{idx:05d}.png")
+
+
+async def run(service, load_path: Path, batch_size: int, wait: float) -> dict:
+    from utils.metrics import JobMetrics
+
+    metrics = JobMetrics("upscale")
+    save_path = Path(tempfile.mkdtemp(prefix="trainkit-batching-"))
+    try:
+        start = time.perf_counter()
+        await service.upscale_images(
+            load_path, save_path, "png",
+            metrics=metrics, encoder_profile="fast",
+            batch_size=batch_size, batch_wait_s=wait,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(save_path, ignore_errors=True)
+
+    summary = metrics.summary()
+    images = summary["counters"].get("images", 0)
+    return {
+        "batch_size": batch_size,
+        "images": images,
+        #Every model call is timed as one inference stage
+        "forward_passes": summary["stages"].get("inference", {}).get("count", 0),
+        "wall_s": round(elapsed, 3),
+        "images_per_s": round(images / elapsed, 2),
+        "inference_s": summary["stages"].get("inference", {}).get("total_s", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, required=True)
+    parser.add_argument("--input", type=Path, help="folder of small images, defaults to generated sprites")
+    parser.add_argument("--count", type=int, default=256)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--wait", type=float, default=2.0, help="batch_wait_s passed to upscale_images")
+    args = parser.parse_args()
+
+    from service.image_upscaling import ImageUpscaleService
+    from utils.image_util import get_device
+
+    service = ImageUpscaleService(get_device(), args.model)
+
+    tmp_input = None
+    load_path = args.input
+    if load_path is None:
+        tmp_input = load_path = Path(tempfile.mkdtemp(prefix="trainkit-sprites-"))
+        make_sprites(load_path, args.count, args.size)
+
+    try:
+        #Warm up kernels and allocator before timing
+        asyncio.run(run(service, load_path, args.batch_sizes[0], args.wait))
+        results = [asyncio.run(run(service, load_path, batch_size, args.wait)) for batch_size in args.batch_sizes]
+    finally:
+        service.cleanup()
+        if tmp_input:
+            shutil.rmtree(tmp_input, ignore_errors=True)
+
+    baseline = results[0]["images_per_s"]
+    for result in results:
+        result["speedup"] = round(result["images_per_s"] / baseline, 2) if baseline else None
+    print(json.dumps({"model": args.model.name, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
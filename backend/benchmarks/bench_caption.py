@@ -0,0 +1,343 @@
+"""Caption pipeline benchmark: ImageCaptioningService on a tiny random LLaVA, no checkpoint download.
+
+Run from the backend directory (needs torch, transformers and accelerate):
+    python benchmarks/bench_caption.py
+    python benchmarks/bench_caption.py --count 16 --max-new-tokens 64 --prompt-words 64 --batch-size 4
+    python benchmarks/bench_caption.py --model-dir /tmp/tiny-llava --layers 8 --hidden-size 512
+
+Builds a randomly initialized LlavaForConditionalGeneration with a CLIP vision
+tower, a Llama language model and a matching processor (word-level tokenizer,
+CLIP image processor, chat template that places the image token like the
+captioning checkpoints do), saves it to --model-dir and captions synthetic
+images on CPU through caption_images. An existing --model-dir is reused.
+
+The model has no EOS token, so every caption runs to --max-new-tokens and runs
+stay comparable. Prefill and token decode are timed with forward hooks: the
+first forward of a generate call sees the whole prompt, later ones one token.
+The service captions one image per generate call, --batch-size above 1 adds a
+batched generate over the same images for comparison. Service logs go to
+stderr, the JSON report to stdout.
+"""
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import List
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+IMAGE_TOKEN = "<image>"
+SPECIAL_TOKENS = ["<unk>", "<s>", "</s>", "<pad>", IMAGE_TOKEN]
+
+#The image goes in front of the first user message, the service prompt never contains it
+CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ message['role'].upper() }}: "
+    "{% if message['role'] == 'user' %}" + IMAGE_TOKEN + " {% endif %}"
+    "{{ message['content'] }}\n"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}ASSISTANT:{% endif %}"
+)
+
+
+def build_model(folder: Path, args):
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import (
+        CLIPImageProcessor,
+        CLIPVisionConfig,
+        LlamaConfig,
+        LlavaConfig,
+        LlavaForConditionalGeneration,
+        LlavaProcessor,
+        PreTrainedTokenizerFast,
+    )
+
+    words = [f"w{idx}" for idx in range(args.vocab_size - len(SPECIAL_TOKENS))]
+    vocab = {token: idx for idx, token in enumerate(SPECIAL_TOKENS + words)}
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="<unk>", bos_token="<s>", eos_token="</s>", pad_token="<pad>",
+        additional_special_tokens=[IMAGE_TOKEN],
+        padding_side="left",
+    )
+
+    image_processor = CLIPImageProcessor(
+        size={"shortest_edge": args.image_size},
+        crop_size={"height": args.image_size, "width": args.image_size},
+    )
+    #CLIP adds a CLS token that the "default" feature strategy drops again
+    processor = LlavaProcessor(
+        image_processor=image_processor,
+        tokenizer=tokenizer,
+        patch_size=args.patch_size,
+        vision_feature_select_strategy="default",
+        chat_template=CHAT_TEMPLATE,
+        image_token=IMAGE_TOKEN,
+        num_additional_image_tokens=1,
+    )
+
+    heads = max(1, args.hidden_size // 64)
+    config = LlavaConfig(
+        vision_config=CLIPVisionConfig(
+            hidden_size=args.vision_hidden_size,
+            intermediate_size=args.vision_hidden_size * 4,
+            num_hidden_layers=args.vision_layers,
+            num_attention_heads=max(1, args.vision_hidden_size // 64),
+            image_size=args.image_size,
+            patch_size=args.patch_size,
+        ),
+        text_config=LlamaConfig(
+            vocab_size=len(vocab),
+            hidden_size=args.hidden_size,
+            intermediate_size=args.hidden_size * 4,
+            num_hidden_layers=args.layers,
+            num_attention_heads=heads,
+            num_key_value_heads=heads,
+            max_position_embeddings=4096,
+            bos_token_id=vocab["<s>"],
+            #No EOS, every caption runs to max_new_tokens
+            eos_token_id=None,
+            pad_token_id=vocab["<pad>"],
+        ),
+        image_token_index=vocab[IMAGE_TOKEN],
+        vision_feature_select_strategy="default",
+        vision_feature_layer=-1,
+    )
+
+    torch.manual_seed(0)
+    model = LlavaForConditionalGeneration(config)
+    model.generation_config.eos_token_id = None
+    model.generation_config.pad_token_id = vocab["<pad>"]
+    model.save_pretrained(folder)
+    processor.save_pretrained(folder)
+
+
+def make_images(folder: Path, count: int, size: int):
+    import numpy as np
+    from PIL import Image
+
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for idx in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(folder / f"image_{idx:03d}.png")
+
+
+def make_prompt(words: int, vocab_size: int) -> str:
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    return " ".join(f"w{idx}" for idx in rng.integers(0, vocab_size - len(SPECIAL_TOKENS), words))
+
+
+class ForwardTimer:
+    def __init__(self):
+        self.prefill: List[float] = []
+        self.decode: List[float] = []
+        self.prompt_tokens: List[int] = []
+        self.decode_tokens = 0
+        self._shape = (0, 0)
+        self._start = 0.0
+
+    def attach(self, model) -> list:
+        return [
+            model.register_forward_pre_hook(self._before, with_kwargs=True),
+            model.register_forward_hook(self._after),
+        ]
+
+    def _before(self, module, args, kwargs):
+        inputs = kwargs.get("inputs_embeds")
+        if inputs is None:
+            inputs = kwargs.get("input_ids")
+        self._shape = tuple(inputs.shape[:2])
+        self._start = time.perf_counter()
+
+    def _after(self, module, args, output):
+        elapsed = time.perf_counter() - self._start
+        batch, length = self._shape
+        #With a KV cache only the first forward of a generate call sees more than one position
+        if length > 1:
+            self.prefill.append(elapsed)
+            self.prompt_tokens.append(length)
+        else:
+            self.decode.append(elapsed)
+            self.decode_tokens += batch
+
+    def summary(self) -> dict:
+        prefill_s, decode_s = sum(self.prefill), sum(self.decode)
+        return {
+            "prefill": {
+                "count": len(self.prefill),
+                "total_s": round(prefill_s, 4),
+                "mean_ms": round(prefill_s / len(self.prefill) * 1000, 2) if self.prefill else 0,
+                "prompt_tokens": max(self.prompt_tokens, default=0),
+            },
+            "token_decode": {
+                "tokens": self.decode_tokens,
+                "total_s": round(decode_s, 4),
+                "tokens_per_s": round(self.decode_tokens / decode_s, 2) if decode_s else 0,
+            },
+        }
+
+
+async def run_service(service, load_path: Path, save_path: Path, prompt: str) -> dict:
+    from utils.metrics import JobMetrics
+
+    metrics = JobMetrics("caption")
+    timer = ForwardTimer()
+    hooks = timer.attach(service._model)
+    start = time.perf_counter()
+    try:
+        decoding = await service.caption_images(load_path, save_path, prompt, metrics=metrics)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    elapsed = time.perf_counter() - start
+
+    summary = metrics.summary()
+    images = summary["counters"].get("images", 0)
+    return {
+        "images": images,
+        "seconds": round(elapsed, 3),
+        "images_per_s": round(images / elapsed, 3),
+        "stages": summary["stages"],
+        **timer.summary(),
+        "decoding": decoding,
+    }
+
+
+def run_batched(service, load_path: Path, prompt: str, batch_size: int) -> dict:
+    import torch
+    from PIL import Image
+
+    paths = sorted(load_path.iterdir())
+    text = service._format_prompt(prompt)
+    timer = ForwardTimer()
+    hooks = timer.attach(service._model)
+    preprocess_s = generate_s = 0.0
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(paths), batch_size):
+            batch = [Image.open(path).convert("RGB") for path in paths[offset:offset + batch_size]]
+
+            step = time.perf_counter()
+            inputs = service._processor(text=[text] * len(batch), images=batch, return_tensors="pt", padding=True)
+            inputs = service._to_device(inputs)
+            preprocess_s += time.perf_counter() - step
+
+            step = time.perf_counter()
+            with torch.no_grad():
+                service._model.generate(**inputs, generation_config=service._generation_config)
+            generate_s += time.perf_counter() - step
+    finally:
+        for hook in hooks:
+            hook.remove()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "batch_size": batch_size,
+        "images": len(paths),
+        "seconds": round(elapsed, 3),
+        "images_per_s": round(len(paths) / elapsed, 3),
+        "preprocess_s": round(preprocess_s, 4),
+        "generate_s": round(generate_s, 4),
+        **timer.summary(),
+    }
+
+
+async def benchmark(args, model_dir: Path, workdir: Path) -> dict:
+    from service.image_captioning import ImageCaptioningService
+    from utils.memory import MemoryMonitor
+
+    monitor = MemoryMonitor.get_instance()
+    monitor.track("bench")
+
+    quantize = {"auto": None, "on": True, "off": False}[args.quantize]
+    service = ImageCaptioningService(model_dir, max_new_tokens=args.max_new_tokens, quantize=quantize)
+    start = time.perf_counter()
+    await service._load_model_async()
+    load_s = time.perf_counter() - start
+    vision = service._model.config.vision_config
+
+    prompt = make_prompt(args.prompt_words, args.vocab_size)
+    images = workdir / "images"
+    make_images(images, args.count, args.size)
+
+    #First generate pays for one-time allocations and kernel selection
+    if args.warmup:
+        warmup = workdir / "warmup"
+        make_images(warmup, args.warmup, args.size)
+        await service.caption_images(warmup, workdir / "warmup-out", prompt)
+
+    report = {
+        "config": {
+            "count": args.count,
+            "size": args.size,
+            "max_new_tokens": args.max_new_tokens,
+            "prompt_words": args.prompt_words,
+            "batch_size": args.batch_size,
+            "image_tokens": (vision.image_size // vision.patch_size) ** 2,
+        },
+        "model": {**service.model_summary(), "load_s": round(load_s, 2)},
+        "service": await run_service(service, images, workdir / "captions", prompt),
+    }
+    if args.batch_size > 1:
+        report["batched"] = await asyncio.to_thread(run_batched, service, images, prompt, args.batch_size)
+
+    report["peak_rss_bytes"] = monitor.untrack("bench")
+    service.cleanup()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=8, help="synthetic images to caption")
+    parser.add_argument("--size", type=int, default=512, help="side of the synthetic images")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--prompt-words", type=int, default=16, help="user prompt length, one token per word")
+    parser.add_argument("--batch-size", type=int, default=1, help="also run batched generate above 1")
+    parser.add_argument("--warmup", type=int, default=1, help="images captioned before measuring")
+    parser.add_argument("--quantize", choices=["auto", "on", "off"], default="auto")
+    parser.add_argument("--threads", type=int, help="sets TRAINKIT_TORCH_THREADS")
+    parser.add_argument("--model-dir", type=Path, help="keep the tiny model here, an existing one is reused and the model options are ignored")
+    parser.add_argument("--vocab-size", type=int, default=1024)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--vision-hidden-size", type=int, default=128)
+    parser.add_argument("--vision-layers", type=int, default=2)
+    parser.add_argument("--image-size", type=int, default=224, help="vision tower input side")
+    parser.add_argument("--patch-size", type=int, default=14)
+    args = parser.parse_args()
+
+    if args.image_size % args.patch_size:
+        parser.error("--image-size must be a multiple of --patch-size")
+
+    #CPU only, before torch is imported
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    if args.threads:
+        os.environ["TRAINKIT_TORCH_THREADS"] = str(args.threads)
+
+    workdir = Path(tempfile.mkdtemp(prefix="trainkit-bench-caption-"))
+    model_dir = args.model_dir or workdir / "tiny-llava"
+    try:
+        with redirect_stdout(sys.stderr):
+            if not (model_dir / "config.json").exists():
+                build_model(model_dir, args)
+            report = asyncio.run(benchmark(args, model_dir, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
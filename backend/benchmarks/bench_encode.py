@@ -0,0 +1,106 @@
+"""Encoder benchmark: encode time vs. output size for every encoder profile.
+
+Run from the backend directory:
+    python benchmarks/bench_encode.py --size 2048 --count 8 --workers 4
+    python benchmarks/bench_encode.py --input path/to/upscaled/images
+
+Without --input, synthetic photo-like images are generated. Each profile and
+format is encoded serially (per-image latency) and through a thread pool the
+same way ImageUpscaleService encodes outputs (throughput).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+import argparse
+import io
+import json
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image
+
+from config.image_formats import ENCODER_PROFILES, SUPPORTED_OUTPUT_FORMATS, SUPPORTED_INPUT_EXTENSIONS, get_encoder_options
+
+
+def synthetic_images(size: int, count: int) -> List[Image.Image]:
+    #Smooth gradients plus noise compress roughly like upscaled photos, unlike flat colors or pure noise
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    images = []
+    for idx in range(count):
+        phase = idx * 0.7
+        base = np.stack([
+            np.sin(x * 6 + phase) * 0.5 + 0.5,
+            np.cos(y * 5 - phase) * 0.5 + 0.5,
+            (x + y) * 0.5,
+        ], axis=-1) * 220
+        noise = rng.normal(0, 6, base.shape)
+        images.append(Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8)))
+    return images
+
+
+def load_images(input_dir: Path, count: int) -> List[Image.Image]:
+    files = sorted(f for f in input_dir.iterdir() if f.suffix.lower() in SUPPORTED_INPUT_EXTENSIONS)[:count]
+    return [Image.open(f).convert("RGB") for f in files]
+
+
+def encode(image: Image.Image, pil_format: str, options: dict) -> int:
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.tell()
+
+
+def bench(images: List[Image.Image], output_format: str, profile: str, workers: int) -> dict:
+    pil_format = SUPPORTED_OUTPUT_FORMATS[output_format]["pil_format"]
+    options = get_encoder_options(output_format, profile)
+
+    latencies = []
+    sizes = []
+    for image in images:
+        start = time.perf_counter()
+        sizes.append(encode(image, pil_format, options))
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda image: encode(image, pil_format, options), images))
+        parallel = time.perf_counter() - start
+
+    raw_bytes = sum(image.width * image.height * 3 for image in images)
+    return {
+        "format": output_format,
+        "profile": profile,
+        "mean_encode_s": round(sum(latencies) / len(latencies), 4),
+        "mean_size_kb": round(sum(sizes) / len(sizes) / 1024, 1),
+        "compression_ratio": round(raw_bytes / sum(sizes), 2),
+        "serial_images_per_s": round(len(images) / sum(latencies), 2),
+        "parallel_images_per_s": round(len(images) / parallel, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, help="folder of images to encode instead of synthetic ones")
+    parser.add_argument("--size", type=int, default=2048, help="synthetic image side in pixels")
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="encode thread pool size")
+    parser.add_argument("--formats", nargs="+", default=["png", "webp", "jpg"])
+    args = parser.parse_args()
+
+    images = load_images(args.input, args.count) if args.input else synthetic_images(args.size, args.count)
+    if not images:
+        sys.exit("No images to encode")
+
+    results = [
+        bench(images, output_format, profile, args.workers)
+        for output_format in args.formats
+        for profile in ENCODER_PROFILES
+    ]
+    print(json.dumps({"images": len(images), "workers": args.workers, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""ONNX Runtime backend benchmark: output parity and CPU tile throughput against eager PyTorch.
+
+Run from the backend directory (needs torch, spandrel and onnxruntime):
+    python benchmarks/bench_onnx.py --model path/to/4x_model.pth
+    python benchmarks/bench_onnx.py --model path/to/model.safetensors --sizes 128 256 512 --batch 4 --repeat 5
+
+Both backends run the same random tiles on CPU with the same thread count.
+Parity is checked on the uint8 outputs the service writes, the script exits
+with status 1 when any pixel differs by more than --tolerance levels.
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def to_uint8(result):
+    #Same conversion as the service postprocess
+    import torch
+
+    return torch.clamp(result, 0, 1).mul(255).byte()
+
+
+def timed(backend, tile, repeat: int):
+    import torch
+
+    with torch.no_grad():
+        backend(tile)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = backend(tile)
+        elapsed = (time.perf_counter() - start) / repeat
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, required=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 512])
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=int, default=1, help="max uint8 difference per pixel")
+    args = parser.parse_args()
+
+    import torch
+    from spandrel import ModelLoader
+    from service.upscale_backends import OnnxRuntimeBackend, TorchBackend
+    from utils.image_util import get_cpu_threads
+
+    threads = get_cpu_threads("TRAINKIT_ORT_THREADS")
+    torch.set_num_threads(threads)
+
+    descriptor = ModelLoader().load_from_file(args.model)
+    model = descriptor.model.to("cpu").eval()
+    multiple = descriptor.size_requirements.multiple_of
+
+    start = time.perf_counter()
+    onnx = OnnxRuntimeBackend(model, args.model, multiple)
+    load_s = time.perf_counter() - start
+    eager = TorchBackend(model, args.model, multiple)
+
+    torch.manual_seed(0)
+    results = []
+    passed = True
+    for size in args.sizes:
+        size = -(-size // multiple) * multiple
+        tile = torch.rand(args.batch, 3, size, size)
+        expected, eager_s = timed(eager, tile, args.repeat)
+        actual, onnx_s = timed(onnx, tile, args.repeat)
+
+        diff = (to_uint8(expected).int() - to_uint8(actual).int()).abs()
+        max_diff = int(diff.max())
+        passed &= max_diff <= args.tolerance
+        results.append({
+            "tile": f"{args.batch}x{size}x{size}",
+            "max_abs_float": round(float((expected - actual).abs().max()), 6),
+            "max_diff_uint8": max_diff,
+            "differing_pixels": round(float((diff > 0).float().mean()), 6),
+            "pytorch_s": round(eager_s, 4),
+            "onnxruntime_s": round(onnx_s, 4),
+            "speedup": round(eager_s / onnx_s, 2),
+        })
+
+    print(json.dumps({
+        "model": args.model.name,
+        "scale": descriptor.scale,
+        "threads": threads,
+        "onnx_load_s": round(load_s, 2),
+        "parity": "pass" if passed else "fail",
+        "results": results,
+    }, indent=2))
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Quantized CPU caption benchmark: int8 language model vs. the unquantized bf16 load.
+
+Run from the backend directory (needs torch, transformers and a LLaVA checkpoint):
+    python benchmarks/bench_quantize.py --model path/to/llava --count 4 --max-new-tokens 64
+
+Each mode runs in its own process so peak RSS is not shared between them.
+Reports model size, peak RSS, tokens/s and images/s per mode. GPU hosts are
+forced onto the CPU path with CUDA_VISIBLE_DEVICES="".
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = {"bf16": False, "int8": True}
+
+
+def make_images(folder: Path, count: int, size: int):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    for idx in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(folder / f"image_{idx:03d}.png")
+
+
+async def run_mode(args) -> dict:
+    from service.image_captioning import ImageCaptioningService
+    from utils.memory import MemoryMonitor
+    from utils.metrics import JobMetrics
+
+    monitor = MemoryMonitor.get_instance()
+    monitor.track("bench")
+
+    service = ImageCaptioningService(args.model, max_new_tokens=args.max_new_tokens, quantize=MODES[args.only])
+    start = time.perf_counter()
+    await service._load_model_async()
+    load_s = time.perf_counter() - start
+
+    load_path = Path(tempfile.mkdtemp(prefix="trainkit-quantize-"))
+    save_path = Path(tempfile.mkdtemp(prefix="trainkit-quantize-out-"))
+    try:
+        make_images(load_path, args.count, args.size)
+        metrics = JobMetrics("caption")
+        start = time.perf_counter()
+        decoding = await service.caption_images(load_path, save_path, args.prompt, metrics=metrics)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(load_path, ignore_errors=True)
+        shutil.rmtree(save_path, ignore_errors=True)
+
+    return {
+        "mode": args.only,
+        "load_s": round(load_s, 2),
+        "model": service.model_summary(),
+        "peak_rss_bytes": monitor.untrack("bench"),
+        "tokens_per_s": decoding["tokens_per_s"],
+        "images_per_s": round(args.count / elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, required=True)
+    parser.add_argument("--count", type=int, default=4)
+    parser.add_argument("--size", type=int, default=336)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--prompt", default="Describe this image.")
+    parser.add_argument("--only", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.only:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    env = {**os.environ, "CUDA_VISIBLE_DEVICES": ""}
+    results = []
+    for mode in MODES:
+        #Service logs share stdout with the child result, which is printed last
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--only", mode],
+            env=env, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    baseline, quantized = results
+    print(json.dumps({
+        "model": args.model.name,
+        "results": results,
+        "memory_ratio": round(quantized["model"]["bytes"] / baseline["model"]["bytes"], 3),
+        "speedup": round(quantized["tokens_per_s"] / baseline["tokens_per_s"], 2) if baseline["tokens_per_s"] else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Startup benchmark: time until /health answers and which heavy modules load at import.
+
+Run from the backend directory:
+    python benchmarks/bench_startup.py --budget 3.0
+
+Exits non-zero when /health is not reachable within the budget or when a heavy
+dependency is imported by `import main`.
+"""
+from pathlib import Path
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+#Must only be imported on first use of the endpoint or service that needs them
+HEAVY_MODULES = ("torch", "torchvision", "transformers", "spandrel", "tiler", "difPy")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import() -> dict:
+    script = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'import_s': elapsed, 'heavy_modules': heavy}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def measure_health(timeout: float) -> float:
+    port = free_port()
+    #Same entry point the Electron backend manager uses
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=0.5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        return float("inf")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds allowed until /health answers")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    imports = measure_import()
+    health = [measure_health(timeout=args.budget * 4) for _ in range(args.runs)]
+
+    report = {
+        "import_s": round(imports["import_s"], 4),
+        "heavy_modules": imports["heavy_modules"],
+        "health_s": [round(value, 4) for value in health],
+        "health_best_s": round(min(health), 4),
+        "budget_s": args.budget,
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if imports["heavy_modules"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(imports['heavy_modules'])}")
+    if min(health) > args.budget:
+        failures.append(f"/health took {min(health):.2f}s, budget is {args.budget:.2f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
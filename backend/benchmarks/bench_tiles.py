@@ -0,0 +1,92 @@
+"""Tile planner benchmark: wasted pixels of fixed square tiles vs. per-image planned tiles.
+
+Run from the backend directory:
+    python benchmarks/bench_tiles.py
+    python benchmarks/bench_tiles.py --input path/to/dataset --recursive --tile-size 512 --overlap 16
+
+Wasted pixels are padding plus overlap that go through the model more than once.
+Without --input a mixed-resolution set of common photo, screenshot and thumbnail
+sizes is used. Only image headers are read, nothing is upscaled.
+"""
+from pathlib import Path
+from typing import Iterable, List, Tuple
+import argparse
+import json
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.image_formats import SUPPORTED_INPUT_EXTENSIONS
+from utils.scanner import scan_dataset
+from utils.tile_planner import TilePlan, fixed_plan, plan_tiles
+
+MIXED_SIZES = [
+    (64, 64), (256, 256), (300, 300), (480, 640), (512, 512), (530, 530), (600, 800),
+    (720, 1280), (768, 1024), (1080, 1920), (1200, 1600), (1440, 2560), (2048, 2048),
+    (2160, 3840), (3000, 4000), (4000, 6000), (900, 3000), (5000, 400),
+]
+
+
+def dataset_sizes(root: Path, recursive: bool) -> List[Tuple[int, int]]:
+    from PIL import Image
+
+    sizes = []
+    for entry in scan_dataset(root, recursive=recursive, extensions=SUPPORTED_INPUT_EXTENSIONS):
+        with Image.open(entry.path) as image:
+            sizes.append((image.height, image.width))
+    return sizes
+
+
+def summarize(plans: Iterable[TilePlan]) -> dict:
+    plans = list(plans)
+    processed = sum(plan.processed_pixels for plan in plans)
+    wasted = sum(plan.wasted_pixels for plan in plans)
+    return {
+        "tiles": sum(plan.tiles for plan in plans),
+        "processed_mpx": round(processed / 1e6, 2),
+        "wasted_mpx": round(wasted / 1e6, 2),
+        "wasted_ratio": round(wasted / processed, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, help="dataset folder, defaults to a built-in mixed-resolution set")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--overlap", type=int, default=16)
+    parser.add_argument("--multiple-of", type=int, default=1, help="size multiple required by the model")
+    parser.add_argument("--per-image", action="store_true", help="include the plan for every image")
+    args = parser.parse_args()
+
+    sizes = dataset_sizes(args.input, args.recursive) if args.input else MIXED_SIZES
+    if not sizes:
+        sys.exit("No images found")
+
+    fixed = [fixed_plan(h, w, args.tile_size, args.overlap) for h, w in sizes]
+    planned = [plan_tiles(h, w, args.tile_size, args.overlap, args.multiple_of) for h, w in sizes]
+
+    report = {
+        "images": len(sizes),
+        "tile_size": args.tile_size,
+        "overlap": args.overlap,
+        "fixed": summarize(fixed),
+        "planned": {**summarize(planned), "direct_images": sum(plan.direct for plan in planned)},
+    }
+    if args.per_image:
+        report["plans"] = [
+            {
+                "size": f"{plan.width}x{plan.height}",
+                "fixed": f"{before.rows}x{before.cols} ({before.wasted_ratio:.1%} wasted)",
+                "planned": (
+                    "direct" if plan.direct
+                    else f"{plan.rows}x{plan.cols} of {plan.tile_width}x{plan.tile_height}"
+                ) + f" ({plan.wasted_ratio:.1%} wasted)",
+            }
+            for before, plan in zip(fixed, planned)
+        ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
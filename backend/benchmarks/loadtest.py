@@ -0,0 +1,335 @@
+"""Load test: the FastAPI layer under concurrent HTTP and websocket clients, with stand-in services.
+
+Run from the backend directory:
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --duration 20 --pollers 16 --ws-clients 8 --renames 4 --jobs 2
+    python benchmarks/loadtest.py --block-ms 200   # fake jobs block the loop, the run must fail
+
+The app runs in a child process with fake caption and upscale services injected
+through the get_service_manager dependency, so no model, GPU or torch is needed.
+Fake jobs do their per-image work in executor threads like the real services,
+--block-ms makes them sleep on the event loop instead. Renames are real, over a
+generated folder of small PNGs.
+
+Reports request latency percentiles per endpoint, websocket fan-out latency
+(server publish time to client receipt, the 50 ms batching interval included)
+and event loop lag sampled inside the server. Exits with status 1 when the p99
+loop lag exceeds --max-lag-ms. Websocket clients need the websockets package.
+"""
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import asyncio
+import importlib.util
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+LAG_INTERVAL_S = 0.01
+
+
+def percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(pct: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": pick(50), "p90_ms": pick(90), "p99_ms": pick(99), "max_ms": pick(100)}
+
+
+#Server side: runs in the child process
+
+
+class LoopLag:
+    def __init__(self, interval_s: float = LAG_INTERVAL_S):
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+
+    async def run(self):
+        #A sleep that wakes up late means something held the loop
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(time.perf_counter() - start - self.interval_s)
+
+
+class FakeWork:
+    def __init__(self, images: int, image_ms: float, block_ms: float):
+        self.images = images
+        self.image_s = image_ms / 1000
+        self.block_s = block_ms / 1000
+
+    async def run(self, label: str, progress_callback=None, cancel_token=None, metrics=None):
+        loop = asyncio.get_running_loop()
+        for idx in range(1, self.images + 1):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            if progress_callback:
+                await progress_callback(idx, self.images, f"{label} image_{idx:03d}.png")
+
+            start = time.perf_counter()
+            if self.block_s:
+                time.sleep(self.block_s)
+            else:
+                await loop.run_in_executor(None, time.sleep, self.image_s)
+            if metrics:
+                metrics.record("inference", time.perf_counter() - start)
+                metrics.count("images")
+
+
+class FakeCaptionService:
+    quantize = False
+
+    def __init__(self, work: FakeWork):
+        self.work = work
+
+    async def caption_images(self, load_path, save_path, prompt, progress_callback=None, cancel_token=None, metrics=None, **kwargs):
+        await self.work.run("Captioning", progress_callback, cancel_token, metrics)
+        return {"mode": "standard"}
+
+    def model_summary(self) -> dict:
+        return {"quantized": False, "bytes": 0}
+
+
+class FakeUpscaleService:
+    def __init__(self, work: FakeWork):
+        self.work = work
+
+    async def upscale_images(self, load_path, save_path, output_format, progress_callback=None, cancel_token=None, metrics=None, **kwargs):
+        await self.work.run("Upscaling", progress_callback, cancel_token, metrics)
+
+
+class FakeServiceManager:
+    def __init__(self, work: FakeWork):
+        self.caption = FakeCaptionService(work)
+        self.upscale = FakeUpscaleService(work)
+
+    def get_caption_service(self, model_path, **kwargs):
+        return self.caption
+
+    def get_upscale_service(self, model_path, **kwargs):
+        return self.upscale
+
+    async def preload_caption_model(self, model_path, progress_callback=None) -> dict:
+        return {"status": "loaded", "model_path": str(model_path), **self.get_gpu_memory_usage()}
+
+    def unload_caption_model(self) -> dict:
+        return self.get_gpu_memory_usage()
+
+    def is_caption_model_loaded(self, model_path=None) -> bool:
+        return True
+
+    def get_gpu_memory_usage(self) -> dict:
+        return {"gpu_memory_allocated_gb": 0, "gpu_memory_reserved_gb": 0, "gpu_memory_total_gb": 0}
+
+    def estimate_memory(self, kind, model_path, max_pixels=0) -> int:
+        return 0
+
+    def get_model_memory(self) -> dict:
+        return {}
+
+
+def serve(args):
+    import uvicorn
+    import main
+    from core import get_service_manager
+
+    fake = FakeServiceManager(FakeWork(args.images, args.image_ms, args.block_ms))
+    main.app.dependency_overrides[get_service_manager] = lambda: fake
+
+    lag = LoopLag()
+
+    async def lag_stats(reset: bool = False):
+        samples = lag.samples
+        if reset:
+            lag.samples = []
+        return percentiles(samples)
+
+    main.app.add_api_route("/loadtest/lag", lag_stats, methods=["GET"])
+
+    async def run():
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.serve, log_level="warning"))
+        monitor = asyncio.create_task(lag.run())
+        try:
+            await server.serve()
+        finally:
+            monitor.cancel()
+
+    asyncio.run(run())
+
+
+#Client side: runs in the parent process
+
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.fanout: List[float] = []
+
+    def add(self, name: str, seconds: float, ok: bool):
+        self.latency.setdefault(name, []).append(seconds)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+async def timed_post(client, recorder: Recorder, name: str, url: str, body: dict):
+    start = time.perf_counter()
+    try:
+        response = await client.post(url, json=body)
+        ok = response.status_code == 200 and "error" not in response.json()
+    except Exception:
+        ok = False
+    recorder.add(name, time.perf_counter() - start, ok)
+
+
+async def poller(client, recorder: Recorder, interval_s: float):
+    #The UI polls model status while jobs run
+    while True:
+        await timed_post(client, recorder, "POST /model-status", "/model-status", {"model_path": "fake-model"})
+        await asyncio.sleep(interval_s)
+
+
+async def job_client(client, recorder: Recorder, idx: int):
+    kind = "caption" if idx % 2 == 0 else "upscale"
+    body = {"load_path": "fake-input", "save_path": "fake-output"}
+    if kind == "caption":
+        body.update(caption_model_path="fake-model", prompt="Describe this image.")
+    else:
+        body.update(upscale_model_path="fake-model", format="png")
+    while True:
+        await timed_post(client, recorder, f"POST /{kind} (job)", f"/{kind}", body)
+
+
+async def rename_client(client, recorder: Recorder, dataset: Path, workdir: Path, idx: int):
+    run = 0
+    while True:
+        save_path = workdir / f"rename-{idx}-{run}"
+        run += 1
+        await timed_post(client, recorder, "POST /rename (job)", "/rename", {
+            "load_path": str(dataset), "save_path": str(save_path), "mode": "sequential",
+        })
+        shutil.rmtree(save_path, ignore_errors=True)
+
+
+async def ws_client(url: str, recorder: Recorder):
+    import websockets
+
+    async with websockets.connect(url) as websocket:
+        await websocket.send(json.dumps({"action": "subscribe"}))
+        async for text in websocket:
+            received = time.time()
+            message = json.loads(text)
+            for event in message.get("events", [message]):
+                if "time" in event:
+                    recorder.fanout.append(received - event["time"])
+
+
+def make_dataset(folder: Path, count: int):
+    from PIL import Image
+
+    folder.mkdir(parents=True)
+    for idx in range(count):
+        Image.new("RGB", (32, 32), (idx % 256, 64, 128)).save(folder / f"sample_{idx:03d}.png")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client, timeout_s: float = 30):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+async def drive(args, port: int, workdir: Path) -> dict:
+    import httpx
+
+    dataset = workdir / "dataset"
+    make_dataset(dataset, args.rename_images)
+    recorder = Recorder()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        await wait_ready(client)
+        await client.get("/loadtest/lag", params={"reset": True})
+
+        tasks = [asyncio.create_task(poller(client, recorder, args.poll_interval)) for _ in range(args.pollers)]
+        tasks += [asyncio.create_task(job_client(client, recorder, idx)) for idx in range(args.jobs)]
+        tasks += [asyncio.create_task(rename_client(client, recorder, dataset, workdir, idx)) for idx in range(args.renames)]
+        tasks += [asyncio.create_task(ws_client(f"ws://127.0.0.1:{port}/ws/progress", recorder)) for _ in range(args.ws_clients)]
+
+        await asyncio.sleep(args.duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        lag = (await client.get("/loadtest/lag")).json()
+        await client.post("/cancel")
+
+    return {
+        "requests": {name: percentiles(samples) for name, samples in sorted(recorder.latency.items())},
+        "errors": recorder.errors,
+        "ws_fanout": percentiles(recorder.fanout),
+        "loop_lag": lag,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--pollers", type=int, default=8, help="clients polling /model-status")
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--ws-clients", type=int, default=4, help="/ws/progress subscribers")
+    parser.add_argument("--jobs", type=int, default=2, help="clients submitting caption and upscale jobs back to back")
+    parser.add_argument("--renames", type=int, default=2, help="clients running overlapping /rename jobs")
+    parser.add_argument("--rename-images", type=int, default=50)
+    parser.add_argument("--images", type=int, default=20, help="images per fake job")
+    parser.add_argument("--image-ms", type=float, default=50, help="executor time per fake image")
+    parser.add_argument("--block-ms", type=float, default=0, help="block the event loop this long per fake image")
+    parser.add_argument("--max-lag-ms", type=float, default=50)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    if args.ws_clients and importlib.util.find_spec("websockets") is None:
+        sys.exit("Websocket clients need the websockets package, install it or pass --ws-clients 0")
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, __file__, *sys.argv[1:], "--serve", str(port)], stdout=subprocess.DEVNULL)
+    workdir = Path(tempfile.mkdtemp(prefix="trainkit-loadtest-"))
+    try:
+        report = asyncio.run(drive(args, port, workdir))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    lag_p99 = report["loop_lag"].get("p99_ms", 0)
+    report["passed"] = lag_p99 <= args.max_lag_ms
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import Dict, Set, List
+from typing import Any, Dict, Set, List
 
 SUPPORTED_INPUT_EXTENSIONS: Set[str] = {
     '.png', '.jpg', '.jpeg', '.bmp', '.webp'
@@ -15,4 +15,48 @@ def get_supported_format() -> List[Dict[str, str]]:
     return [
         {"value": key, "label": info["name"], "extension": info["extension"]}
         for key, info in SUPPORTED_OUTPUT_FORMATS.items()
-    ]
\ No newline at end of file
+    ]
+
+DEFAULT_ENCODER_PROFILE = "balanced"
+
+# Keyword arguments passed to Image.save per output format.
+# "balanced" spells out the PIL defaults so outputs match earlier versions.
+ENCODER_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "fast": {
+        "png": {"compress_level": 1},
+        "webp": {"quality": 90, "method": 0},
+        "jpg": {"quality": 90, "optimize": False, "subsampling": "4:2:0"},
+        "bmp": {},
+    },
+    "balanced": {
+        "png": {"compress_level": 6},
+        "webp": {"quality": 80, "method": 4},
+        "jpg": {"quality": 75, "optimize": False, "subsampling": "4:2:0"},
+        "bmp": {},
+    },
+    "smallest": {
+        "png": {"compress_level": 9, "optimize": True},
+        "webp": {"quality": 80, "method": 6},
+        "jpg": {"quality": 75, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "bmp": {},
+    },
+    # Exact pixels where the format allows it, for WebP quality is the compression effort.
+    # JPEG has no lossless mode in PIL, it gets its highest quality without chroma subsampling.
+    "lossless": {
+        "png": {"compress_level": 6},
+        "webp": {"lossless": True, "quality": 80, "method": 4},
+        "jpg": {"quality": 100, "optimize": True, "subsampling": "4:4:4"},
+        "bmp": {},
+    },
+}
+
+def get_encoder_options(output_format: str, profile: str = DEFAULT_ENCODER_PROFILE) -> Dict[str, Any]:
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile: {profile}. Use one of {', '.join(ENCODER_PROFILES)}")
+    return dict(ENCODER_PROFILES[profile].get(output_format.lower(), {}))
+
+def get_encoder_profiles() -> List[Dict[str, Any]]:
+    return [
+        {"value": name, "formats": options}
+        for name, options in ENCODER_PROFILES.items()
+    ]
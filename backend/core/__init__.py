@@ -1,5 +1,6 @@
 from .websocket import ConnectionManager
-from .dependencies import get_connection_manager, get_service_manager, get_rename_service
+from .jobs import Job, JobManager, job_response, RESOURCE_GPU, RESOURCE_IO
+from .dependencies import get_connection_manager, get_service_manager, get_rename_service, get_job_manager
 from .exceptions import (
     TrainKitException,
     ModelLoadError,
@@ -10,9 +11,15 @@ from .exceptions import (
 
 __all__ = [
     "ConnectionManager",
+    "Job",
+    "JobManager",
+    "job_response",
+    "RESOURCE_GPU",
+    "RESOURCE_IO",
     "get_connection_manager",
     "get_service_manager",
     "get_rename_service",
+    "get_job_manager",
     "TrainKitException",
     "ModelLoadError",
     "ProcessingError",
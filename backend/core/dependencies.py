@@ -1,4 +1,5 @@
 from .websocket import ConnectionManager
+from .jobs import JobManager
 from service.service_manager import ServiceManager
 from service.image_rename import RenameService
 
@@ -11,9 +12,5 @@ def get_service_manager() -> ServiceManager:
 def get_rename_service() -> RenameService:
     return RenameService()
 
-# future ncnn integration point:
-# def get_upscale_backend(backend: str = "pytorch"):
-#     if backend == "ncnn":
-#         from service.ncnn_upscale import NCNNUpscaleService
-#         return NCNNUpscaleService.get_instance()
-#     return get_service_manager()
+def get_job_manager() -> JobManager:
+    return JobManager.get_instance()
@@ -0,0 +1,287 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+from .websocket import ConnectionManager
+from service.base import CancellationToken, OperationCancelled
+from service.service_manager import ServiceManager
+from utils.memory import GB, MemoryMonitor
+from utils.metrics import MetricsRegistry
+import asyncio
+import heapq
+import itertools
+import time
+import uuid
+
+#Resource classes: model jobs hold the GPU exclusively, file jobs are I/O bound
+RESOURCE_GPU = "gpu"
+RESOURCE_IO = "io"
+
+DEFAULT_CONCURRENCY: Dict[str, int] = {
+    RESOURCE_GPU: 1,
+    RESOURCE_IO: 2,
+}
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED)
+
+JobRunner = Callable[["Job"], Awaitable[Optional[dict]]]
+#Frees memory held outside of jobs (loaded models) before a job is rejected
+EvictHook = Callable[["Job"], None]
+
+
+class Job:
+    def __init__(
+        self,
+        kind: str,
+        runner: JobRunner,
+        resource_class: str,
+        priority: int = 0,
+        memory_estimate: int = 0,
+        model_path: Optional[Path] = None,
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.resource_class = resource_class
+        self.priority = priority
+        #Host RAM the job is expected to add, 0 skips admission
+        self.memory_estimate = memory_estimate
+        self.model_path = model_path
+        self.peak_rss: Optional[int] = None
+        self.status = STATUS_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.cancel_token = CancellationToken()
+        self._runner = runner
+        self._done = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    async def wait(self):
+        await self._done.wait()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "resource_class": self.resource_class,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "memory_estimate": self.memory_estimate,
+            "peak_rss": self.peak_rss,
+        }
+
+
+class JobManager:
+    _instance = None
+
+    def __init__(
+        self,
+        events: Optional[ConnectionManager] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        history_size: int = 200,
+        memory: Optional[MemoryMonitor] = None,
+        evict: Optional[EvictHook] = None,
+    ):
+        self.events = events
+        self.memory = memory
+        self.evict = evict
+        self.concurrency: Dict[str, int] = dict(concurrency or DEFAULT_CONCURRENCY)
+        self.history_size = history_size
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: List[Tuple[int, int, Job]] = []
+        self._running: Dict[str, int] = {}
+        self._counter = itertools.count()
+
+    @classmethod
+    def get_instance(cls) -> "JobManager":
+        if cls._instance is None:
+            cls._instance = cls(
+                events=ConnectionManager.get_instance(),
+                memory=MemoryMonitor.get_instance(),
+                evict=lambda job: ServiceManager.get_instance().evict(keep=job.model_path),
+            )
+        return cls._instance
+
+    def submit(
+        self,
+        kind: str,
+        runner: JobRunner,
+        resource_class: str = RESOURCE_GPU,
+        priority: int = 0,
+        memory_estimate: int = 0,
+        model_path: Optional[Path] = None,
+    ) -> Job:
+        if resource_class not in self.concurrency:
+            raise ValueError(f"Unknown resource class: {resource_class}")
+
+        job = Job(kind, runner, resource_class, priority, memory_estimate, model_path)
+        self._jobs[job.id] = job
+        #Higher priority first, FIFO within the same priority
+        heapq.heappush(self._queue, (-priority, next(self._counter), job))
+        self._trim_history()
+        self._publish(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self, status: Optional[str] = None) -> List[Job]:
+        return [job for job in self._jobs.values() if status is None or job.status == status]
+
+    def set_concurrency(self, resource_class: str, limit: int):
+        if resource_class not in self.concurrency:
+            raise ValueError(f"Unknown resource class: {resource_class}")
+        if limit < 1:
+            raise ValueError("Concurrency limit must be at least 1")
+        if resource_class == RESOURCE_GPU and limit != 1:
+            #ServiceManager keeps one model per kind and swaps it between jobs, a second GPU job could free a model in use
+            raise ValueError("The gpu resource class runs one job at a time, its limit is fixed at 1")
+        self.concurrency[resource_class] = limit
+        self._dispatch()
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+
+        if job.status == STATUS_QUEUED:
+            self._queue = [entry for entry in self._queue if entry[2] is not job]
+            heapq.heapify(self._queue)
+            self._finish(job, STATUS_CANCELLED)
+        else:
+            #Running jobs stop at their next tile, image or token check
+            job.cancel_token.cancel()
+        return True
+
+    def cancel_all(self) -> List[Job]:
+        active = [job for job in self._jobs.values() if not job.finished]
+        for job in active:
+            self.cancel(job.id)
+        return active
+
+    def _dispatch(self):
+        #A saturated class must not block jobs of other classes queued behind it
+        deferred = []
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            job = entry[2]
+            if self._running.get(job.resource_class, 0) >= self.concurrency[job.resource_class]:
+                deferred.append(entry)
+                continue
+
+            admitted = self._admit(job)
+            if admitted:
+                self._start(job)
+            elif admitted is not None:
+                deferred.append(entry)
+
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    def _admit(self, job: Job) -> Optional[bool]:
+        #True starts the job, False keeps it queued until running jobs free memory, None rejected it
+        if self.memory is None or job.memory_estimate <= 0:
+            return True
+
+        reserved = sum(
+            other.memory_estimate for other in self._jobs.values() if other.status == STATUS_RUNNING
+        )
+        if self.memory.fits(job.memory_estimate, reserved):
+            return True
+        if reserved > 0:
+            return False
+
+        #Nothing else is running, the only memory left to reclaim is held by idle models
+        if self.evict is not None:
+            self.evict(job)
+            if self.memory.fits(job.memory_estimate):
+                return True
+
+        job.error = (
+            f"Not enough memory to run {job.kind}: needs about {job.memory_estimate / GB:.1f} GB, "
+            f"{max(self.memory.headroom(), 0) / GB:.1f} GB of the {self.memory.budget_bytes / GB:.1f} GB budget is free"
+        )
+        self._finish(job, STATUS_FAILED)
+        if self.events is not None:
+            asyncio.create_task(self.events.send_log("error", job.error, "backend", job.id))
+        return None
+
+    def _start(self, job: Job):
+        self._running[job.resource_class] = self._running.get(job.resource_class, 0) + 1
+        job.status = STATUS_RUNNING
+        job.started_at = time.time()
+        if self.memory is not None:
+            self.memory.track(job.id)
+        self._publish(job)
+        job._task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        try:
+            job.result = await job._runner(job) or {}
+            self._finish(job, STATUS_COMPLETED)
+        except OperationCancelled:
+            self._finish(job, STATUS_CANCELLED)
+            if self.events is not None:
+                await self.events.send_log("warning", f"{job.kind.capitalize()} job cancelled", "backend", job.id)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, STATUS_FAILED)
+            if self.events is not None:
+                await self.events.send_log("error", str(e), "backend", job.id)
+        finally:
+            self._running[job.resource_class] -= 1
+            self._dispatch()
+
+    def _finish(self, job: Job, status: str):
+        if self.memory is not None and job.started_at is not None:
+            job.peak_rss = self.memory.untrack(job.id)
+        job.status = status
+        job.finished_at = time.time()
+        job._done.set()
+        self._publish(job)
+
+        registry = MetricsRegistry.get_instance()
+        registry.counter("trainkit_jobs_total", "Finished jobs by kind and status").inc(
+            kind=job.kind, status=status
+        )
+        if job.started_at is not None:
+            registry.histogram("trainkit_job_seconds", "Job run time").observe(
+                job.finished_at - job.started_at, kind=job.kind
+            )
+
+    def _publish(self, job: Job):
+        if self.events is not None:
+            self.events.publish({"type": "job", **job.to_dict()}, job.id)
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+
+async def job_response(job: Job, wait: bool = True) -> dict:
+    if not wait:
+        return {"status": job.status, "job_id": job.id}
+
+    await job.wait()
+    if job.status == STATUS_COMPLETED:
+        return {**job.result, "job_id": job.id}
+    if job.status == STATUS_CANCELLED:
+        return {"status": "cancelled", "job_id": job.id}
+    return {"error": job.error, "job_id": job.id}
@@ -1,27 +1,270 @@
 from fastapi import WebSocket
-from typing import List
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+import asyncio
+import json
+import time
+
+LOG_OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+#Queue entry standing in for the latest progress of a job, resolved when the batch is flushed
+ProgressSlot = Tuple[str, Optional[str]]
+
+
+class EventBuffer:
+    def __init__(self, capacity: int = 5000):
+        self._events: Deque[dict] = deque(maxlen=capacity)
+        self._next_seq = 1
+
+    @property
+    def first_seq(self) -> int:
+        return self._events[0]["seq"] if self._events else self._next_seq
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    def append(self, event: dict) -> dict:
+        event["seq"] = self._next_seq
+        self._next_seq += 1
+        self._events.append(event)
+        return event
+
+    def since(self, seq: int) -> List[dict]:
+        if not self._events or seq >= self.last_seq:
+            return []
+        start = max(0, seq + 1 - self.first_seq)
+        return [self._events[idx] for idx in range(start, len(self._events))]
+
+
+class ClientSession:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue_size: int = 1000,
+        overflow_policy: str = "drop_oldest",
+        flush_interval: float = 0.05,
+    ):
+        if overflow_policy not in LOG_OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.websocket = websocket
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.flush_interval = flush_interval
+        self.job_ids: Optional[Set[str]] = None
+        self.event_types: Optional[Set[str]] = None
+        self.dropped = 0
+        self.closed = False
+        self._queue: Deque[Union[dict, ProgressSlot]] = deque()
+        self._progress: Dict[Optional[str], dict] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, on_close):
+        self._task = asyncio.create_task(self._run(on_close))
+
+    def subscribe(self, job_ids: Optional[Iterable[str]] = None, event_types: Optional[Iterable[str]] = None):
+        self.job_ids = set(job_ids) if job_ids is not None else None
+        self.event_types = set(event_types) if event_types is not None else None
+
+    def matches(self, event: dict) -> bool:
+        if self.event_types is not None and event["type"] not in self.event_types:
+            return False
+        if self.job_ids is not None and event.get("job_id") not in self.job_ids:
+            return False
+        return True
+
+    def enqueue(self, event: dict, force: bool = False) -> bool:
+        if self.closed:
+            return False
+        if event["type"] == "progress":
+            self._enqueue_progress(event)
+            return True
+        return self._enqueue_event(event, force)
+
+    def _enqueue_progress(self, event: dict):
+        #Coalesce: only the latest progress of a job matters, keep the slot of the pending one
+        job_id = event.get("job_id")
+        if job_id not in self._progress:
+            self._queue.append(("progress", job_id))
+        self._progress[job_id] = event
+        self._wakeup.set()
+
+    def _enqueue_event(self, event: dict, force: bool = False) -> bool:
+        queued_events = len(self._queue) - len(self._progress)
+        if not force and queued_events >= self.max_queue_size:
+            if self.overflow_policy == "disconnect":
+                return False
+            self.dropped += 1
+            if self.overflow_policy == "drop_newest" or not self._drop_oldest_event():
+                return True
+
+        self._queue.append(event)
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest_event(self) -> bool:
+        #Forced control events (subscribed, gap, error) carry no seq and are never evicted
+        for idx, item in enumerate(self._queue):
+            if isinstance(item, dict) and item.get("seq") is not None:
+                del self._queue[idx]
+                return True
+        return False
+
+    def _drain(self) -> List[dict]:
+        events = []
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            events.append({
+                "type": "log",
+                "level": "warning",
+                "message": f"{dropped} log messages dropped (client too slow)",
+                "source": "backend",
+                "seq": None,
+            })
+
+        while self._queue:
+            item = self._queue.popleft()
+            if isinstance(item, tuple):
+                item = self._progress.pop(item[1])
+            events.append(item)
+        return events
+
+    async def _run(self, on_close):
+        try:
+            while True:
+                await self._wakeup.wait()
+                #Give the producers one flush interval to fill the batch
+                if self.flush_interval > 0:
+                    await asyncio.sleep(self.flush_interval)
+                self._wakeup.clear()
+
+                events = self._drain()
+                if events:
+                    await self.websocket.send_text(json.dumps({"type": "batch", "events": events}))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            on_close(self.websocket)
+
+    def close(self):
+        self.closed = True
+        self._queue.clear()
+        self._progress.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
 
 class ConnectionManager:
     _instance = None
-    
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
+
+    def __init__(
+        self,
+        max_queue_size: int = 1000,
+        overflow_policy: str = "drop_oldest",
+        flush_interval: float = 0.05,
+        buffer_size: int = 5000,
+    ):
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.flush_interval = flush_interval
+        self.buffer = EventBuffer(buffer_size)
+        self.sessions: List[ClientSession] = []
+
     @classmethod
     def get_instance(cls) -> "ConnectionManager":
         if cls._instance is None:
             cls._instance = cls()
         return cls._instance
-    
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return [session.websocket for session in self.sessions]
+
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-    
+        session = ClientSession(websocket, self.max_queue_size, self.overflow_policy, self.flush_interval)
+        self.sessions.append(session)
+        session.start(self.disconnect)
+
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-    
-    async def send_progress(self, current: int, total: int, message: str):
+        for session in list(self.sessions):
+            if session.websocket is websocket:
+                session.close()
+                self.sessions.remove(session)
+
+    def _get_session(self, websocket: WebSocket) -> Optional[ClientSession]:
+        for session in self.sessions:
+            if session.websocket is websocket:
+                return session
+        return None
+
+    async def handle_message(self, websocket: WebSocket, text: str):
+        session = self._get_session(websocket)
+        if session is None:
+            return
+
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict) or message.get("action") != "subscribe":
+            return
+
+        error = self._subscribe_error(message)
+        if error:
+            session.enqueue({"type": "error", "message": error, "seq": None}, force=True)
+            return
+
+        session.subscribe(message.get("job_ids"), message.get("types"))
+        session.enqueue({
+            "type": "subscribed",
+            "job_ids": message.get("job_ids"),
+            "types": message.get("types"),
+            "last_seq": self.buffer.last_seq,
+            "seq": None,
+        }, force=True)
+
+        since = message.get("since")
+        if since is not None:
+            self._replay(session, since)
+
+    @staticmethod
+    def _subscribe_error(message: dict) -> Optional[str]:
+        #A bare string would pass set() and filter on its characters
+        for key in ("job_ids", "types"):
+            value = message.get(key)
+            if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+                return f"{key} must be a list of strings"
+        since = message.get("since")
+        if since is not None and (isinstance(since, bool) or not isinstance(since, int)):
+            return "since must be an integer sequence number"
+        return None
+
+    def _replay(self, session: ClientSession, since: int):
+        if since + 1 < self.buffer.first_seq:
+            session.enqueue({
+                "type": "gap",
+                "requested_seq": since,
+                "first_seq": self.buffer.first_seq,
+                "seq": None,
+            }, force=True)
+
+        events = [event for event in self.buffer.since(since) if session.matches(event)]
+        #Only the last progress of each job is worth replaying
+        last_progress = {}
+        for event in events:
+            if event["type"] == "progress":
+                last_progress[event.get("job_id")] = event["seq"]
+
+        for event in events:
+            if event["type"] == "progress" and last_progress[event.get("job_id")] != event["seq"]:
+                continue
+            #Replay is bounded by the buffer size, it must not evict itself
+            session.enqueue(event, force=True)
+
+    async def send_progress(self, current: int, total: int, message: str, job_id: Optional[str] = None):
         data = {
             "type": "progress",
             "current": current,
@@ -29,24 +272,35 @@ class ConnectionManager:
             "message": message,
             "percent": round((current / total) * 100, 1) if total > 0 else 0
         }
-        await self._broadcast(data)
-    
-    async def send_log(self, level: str, message: str, source: str = "backend"):
+        self.publish(data, job_id)
+
+    async def send_log(self, level: str, message: str, source: str = "backend", job_id: Optional[str] = None):
         data = {
             "type": "log",
             "level": level,
             "message": message,
             "source": source
         }
-        await self._broadcast(data)
-    
-    async def _broadcast(self, data: dict):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(data)
-            except Exception:
-                disconnected.append(connection)
-        
-        for conn in disconnected:
-            self.disconnect(conn)
+        self.publish(data, job_id)
+
+    #Publishing never awaits the sockets, each client drains its own queue in its sender task
+    def publish(self, data: dict, job_id: Optional[str] = None) -> dict:
+        if job_id is not None:
+            data["job_id"] = job_id
+        data["time"] = time.time()
+        event = self.buffer.append(data)
+
+        overflowed = [
+            session for session in self.sessions
+            if session.matches(event) and not session.enqueue(event)
+        ]
+        for session in overflowed:
+            self.disconnect(session.websocket)
+            asyncio.create_task(self._close_socket(session.websocket))
+        return event
+
+    async def _close_socket(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
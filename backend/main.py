@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from typing import AsyncIterator
 from contextlib import asynccontextmanager
-from routers import caption_router, upscale_router, rename_router, system_router
+from routers import caption_router, upscale_router, rename_router, system_router, jobs_router, catalog_router
 from core import TrainKitException, trainkit_exception_handler
 from service.service_manager import ServiceManager
 
@@ -12,8 +12,8 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     yield
     #Cleanup resources
     print("Shutting down TrainKit backend...")
-    service_manager = ServiceManager.get_instance()
-    service_manager.cleanup()
+    # reset() only cleans up an existing instance, it never creates one
+    ServiceManager.reset()
 
 
 app = FastAPI(
@@ -43,6 +43,8 @@ app.include_router(caption_router)
 app.include_router(upscale_router)
 app.include_router(rename_router)
 app.include_router(system_router)
+app.include_router(jobs_router)
+app.include_router(catalog_router)
 
 
 # future ncnn integration point:
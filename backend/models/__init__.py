@@ -1,19 +1,33 @@
 from .requests import (
+    JobOptions,
+    ScanOptions,
+    ShardOptions,
+    ProfileOptions,
     RenameRequest,
     UpscaleRequest,
     CaptionRequest,
     PreloadRequest,
     ModelStatusRequest,
+    ConcurrencyRequest,
+    MemoryBudgetRequest,
+    CatalogRequest,
     StatusResponse,
     ErrorResponse,
 )
 
 __all__ = [
+    "JobOptions",
+    "ScanOptions",
+    "ShardOptions",
+    "ProfileOptions",
     "RenameRequest",
     "UpscaleRequest",
     "CaptionRequest",
     "PreloadRequest",
     "ModelStatusRequest",
+    "ConcurrencyRequest",
+    "MemoryBudgetRequest",
+    "CatalogRequest",
     "StatusResponse",
     "ErrorResponse",
 ]
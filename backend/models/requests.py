@@ -1,24 +1,82 @@
 from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 
-class RenameRequest(BaseModel):
+class JobOptions(BaseModel):
+    #wait=False returns the job id immediately, poll /jobs/{job_id} for the outcome
+    wait: bool = True
+    priority: int = 0
+
+class ScanOptions(BaseModel):
+    recursive: bool = False
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    natural_sort: bool = False
+    #Stream the members of .tar/.zip shards found in load_path, an archive load_path is always streamed
+    shards: bool = False
+    
+    def scan_options(self) -> dict:
+        return {
+            "recursive": self.recursive,
+            "include": self.include,
+            "exclude": self.exclude,
+            "natural_sort": self.natural_sort,
+            "shards": self.shards,
+        }
+
+class ShardOptions(BaseModel):
+    #Write outputs into size-capped <kind>-000000.tar shards in save_path instead of loose files
+    output_shards: bool = False
+    shard_format: str = "tar"
+    shard_max_mb: int = 1024
+    
+    def shard_options(self) -> Optional[dict]:
+        if not self.output_shards:
+            return None
+        return {
+            "shard_format": self.shard_format,
+            "max_bytes": self.shard_max_mb * 1024 * 1024,
+        }
+
+class ProfileOptions(BaseModel):
+    #Capture a profiler trace for the first profile_max_images images, see /traces
+    profile: bool = False
+    profile_max_images: int = 5
+
+class RenameRequest(JobOptions, ScanOptions, ShardOptions, ProfileOptions):
     load_path: str
     save_path: str
     mode: str = "sequential"
     skip_duplicates: bool = False
 
-class UpscaleRequest(BaseModel):
+class UpscaleRequest(JobOptions, ScanOptions, ShardOptions, ProfileOptions):
     upscale_model_path: str
     load_path: str
     save_path: str
     format: str
     use_tiling: bool = True
-    # backend: str = "pytorch" | "ncnn"
+    encoder_profile: str = "balanced"
+    #Reuse decoded pixels from earlier runs over the same files, see /decode-cache
+    decode_cache: bool = False
+    #Same-size images that fit in one tile run batch_size at a time, a partial batch waits at most batch_wait_s
+    batch_size: int = 1
+    batch_wait_s: float = 2.0
+    #"pytorch" runs on the app device, "onnxruntime" runs an exported graph on CPU, see /upscale-backends
+    backend: str = "pytorch"
 
-class CaptionRequest(BaseModel):
+class CaptionRequest(JobOptions, ScanOptions, ShardOptions, ProfileOptions):
     caption_model_path: str
     load_path: str
     save_path: str
     prompt: str
+    decode_cache: bool = False
+    #Reuse vision tower outputs for unchanged images and model, a new prompt only pays for generation
+    feature_cache: bool = False
+    #Smaller LLaVA sharing the tokenizer and image processor, drafts tokens the main model verifies in one pass
+    assistant_model_path: Optional[str] = None
+    #Drafts copied from n-grams already in the prompt, no extra model, used when no assistant model is set
+    prompt_lookup_num_tokens: Optional[int] = None
+    #int8 language model on CPU-only hosts, None quantizes automatically when there is no GPU
+    quantize: Optional[bool] = None
 
 class PreloadRequest(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
@@ -28,6 +86,18 @@ class ModelStatusRequest(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
     model_path: str
 
+class ConcurrencyRequest(BaseModel):
+    resource_class: str
+    limit: int
+
+class MemoryBudgetRequest(BaseModel):
+    budget_mb: int
+
+class CatalogRequest(JobOptions):
+    #Folder to catalog, the SQLite file lives in TRAINKIT_CATALOG_DIR so the dataset stays untouched
+    load_path: str
+    recursive: bool = False
+
 class StatusResponse(BaseModel):
     status: str
 
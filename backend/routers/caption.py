@@ -1,8 +1,22 @@
 from fastapi import APIRouter, Depends
 from pathlib import Path
+import asyncio
 from models import CaptionRequest, PreloadRequest, ModelStatusRequest
-from core import get_connection_manager, get_service_manager, ConnectionManager
+from core import (
+    get_connection_manager,
+    get_service_manager,
+    get_job_manager,
+    ConnectionManager,
+    Job,
+    JobManager,
+    job_response,
+    RESOURCE_GPU,
+)
 from service.service_manager import ServiceManager
+from utils.metrics import JobMetrics
+from utils.profiling import JobProfiler
+from utils.decode_cache import DecodeCache
+from utils.feature_cache import FeatureCache
 
 router = APIRouter(prefix="", tags=["caption"])
 
@@ -11,57 +25,105 @@ async def caption(
     request: CaptionRequest,
     manager: ConnectionManager = Depends(get_connection_manager),
     service_manager: ServiceManager = Depends(get_service_manager),
+    job_manager: JobManager = Depends(get_job_manager),
 ):
-    try:
-        await manager.send_log("info", f"Loading caption model from {request.caption_model_path}", "backend")
+    async def run(job: Job) -> dict:
+        metrics = JobMetrics("caption")
+        await manager.send_log("info", f"Loading caption model from {request.caption_model_path}", "backend", job.id)
         
         service = service_manager.get_caption_service(
-            model_path=Path(request.caption_model_path)
+            model_path=Path(request.caption_model_path),
+            quantize=request.quantize
         )
         
         async def progress(current: int, total: int, msg: str):
-            await manager.send_progress(current, total, msg)
-            await manager.send_log("info", msg, "backend")
+            await manager.send_progress(current, total, msg, job.id)
+            await manager.send_log("info", msg, "backend", job.id)
         
-        await service.caption_images(
-            load_path=Path(request.load_path),
-            save_path=Path(request.save_path),
-            prompt=request.prompt,
-            progress_callback=progress
-        )
+        profiler = None
+        if request.profile:
+            profiler = JobProfiler(job.id, "caption", "torch", request.profile_max_images)
+            await profiler.start()
         
-        await manager.send_log("success", "Captioning complete!", "backend")
-        return {"status": "Captioning complete!"}
-    except Exception as e:
-        await manager.send_log("error", str(e), "backend")
-        return {"error": str(e)}
+        try:
+            decoding = await service.caption_images(
+                load_path=Path(request.load_path),
+                save_path=Path(request.save_path),
+                prompt=request.prompt,
+                progress_callback=progress,
+                cancel_token=job.cancel_token,
+                scan_options=request.scan_options(),
+                metrics=metrics,
+                profiler=profiler,
+                shard_options=request.shard_options(),
+                decode_cache=DecodeCache.get_instance() if request.decode_cache else None,
+                feature_cache=FeatureCache.get_instance() if request.feature_cache else None,
+                assistant_model_path=Path(request.assistant_model_path) if request.assistant_model_path else None,
+                prompt_lookup_num_tokens=request.prompt_lookup_num_tokens
+            )
+        finally:
+            if profiler:
+                await profiler.stop()
+        
+        await manager.send_log("success", "Captioning complete!", "backend", job.id)
+        result = {
+            "status": "Captioning complete!",
+            "metrics": metrics.summary(),
+            "decoding": decoding,
+            "model": service.model_summary(),
+        }
+        if profiler:
+            result["profile"] = profiler.summary()
+        return result
+    
+    # Walks the weights on disk, kept off the event loop
+    model_path = Path(request.caption_model_path)
+    memory_estimate = await asyncio.to_thread(service_manager.estimate_memory, "caption", model_path)
+    if request.assistant_model_path:
+        memory_estimate += await asyncio.to_thread(
+            service_manager.estimate_memory, "caption", Path(request.assistant_model_path)
+        )
+    job = job_manager.submit(
+        "caption", run, resource_class=RESOURCE_GPU, priority=request.priority,
+        memory_estimate=memory_estimate, model_path=model_path,
+    )
+    return await job_response(job, request.wait)
 
 @router.post("/preload")
 async def preload_model(
     request: PreloadRequest,
     manager: ConnectionManager = Depends(get_connection_manager),
     service_manager: ServiceManager = Depends(get_service_manager),
+    job_manager: JobManager = Depends(get_job_manager),
 ):
-    try:
-        model_path = Path(request.model_path)
-        
-        if not model_path.exists():
-            return {"error": "Model path does not exist"}
-        
-        await manager.send_log("info", f"Preloading caption model from {model_path}...", "backend")
+    model_path = Path(request.model_path)
+    
+    if not model_path.exists():
+        return {"error": "Model path does not exist"}
+    
+    # Loading a model competes for the GPU like any other model job
+    async def run(job: Job) -> dict:
+        await manager.send_log("info", f"Preloading caption model from {model_path}...", "backend", job.id)
         
         async def progress(current: int, total: int, msg: str):
-            await manager.send_progress(current, total, msg)
-            await manager.send_log("info", msg, "backend")
+            await manager.send_progress(current, total, msg, job.id)
+            await manager.send_log("info", msg, "backend", job.id)
         
-        result = await service_manager.preload_caption_model(model_path, progress)
+        try:
+            result = await service_manager.preload_caption_model(model_path, progress)
+        except Exception as e:
+            raise RuntimeError(f"Failed to preload model: {str(e)}")
         
-        await manager.send_log("success", f"Model preloaded! Using {result.get('gpu_memory_allocated_gb', 0):.2f} GB GPU memory", "backend")
+        await manager.send_log("success", f"Model preloaded! Using {result.get('gpu_memory_allocated_gb', 0):.2f} GB GPU memory", "backend", job.id)
         
         return result
-    except Exception as e:
-        await manager.send_log("error", f"Failed to preload model: {str(e)}", "backend")
-        return {"error": str(e)}
+    
+    memory_estimate = await asyncio.to_thread(service_manager.estimate_memory, "caption", model_path)
+    job = job_manager.submit(
+        "preload", run, resource_class=RESOURCE_GPU,
+        memory_estimate=memory_estimate, model_path=model_path,
+    )
+    return await job_response(job)
 
 @router.post("/model-status")
 async def model_status(
@@ -85,18 +147,22 @@ async def model_status(
 async def unload_model(
     manager: ConnectionManager = Depends(get_connection_manager),
     service_manager: ServiceManager = Depends(get_service_manager),
+    job_manager: JobManager = Depends(get_job_manager),
 ):
-    try:
-        await manager.send_log("info", "Unloading caption model...", "backend")
+    async def run(job: Job) -> dict:
+        await manager.send_log("info", "Unloading caption model...", "backend", job.id)
         
-        memory_info = service_manager.unload_caption_model()
+        try:
+            memory_info = service_manager.unload_caption_model()
+        except Exception as e:
+            raise RuntimeError(f"Failed to unload model: {str(e)}")
         
-        await manager.send_log("success", "Caption model unloaded from GPU memory", "backend")
+        await manager.send_log("success", "Caption model unloaded from GPU memory", "backend", job.id)
         
         return {
             "status": "unloaded",
             **memory_info
         }
-    except Exception as e:
-        await manager.send_log("error", f"Failed to unload model: {str(e)}", "backend")
-        return {"error": str(e)}
+    
+    job = job_manager.submit("unload", run, resource_class=RESOURCE_GPU)
+    return await job_response(job)
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends
+from pathlib import Path
+from typing import Optional
+import asyncio
+from models import CatalogRequest
+from core import (
+    get_connection_manager,
+    get_job_manager,
+    ConnectionManager,
+    Job,
+    JobManager,
+    job_response,
+    RESOURCE_IO,
+)
+from service.catalog import DatasetCatalog
+
+router = APIRouter(prefix="/catalog", tags=["catalog"])
+
+def open_catalog(load_path: str) -> Optional[DatasetCatalog]:
+    catalog = DatasetCatalog.get(Path(load_path))
+    return catalog if catalog.exists else None
+
+@router.post("")
+async def refresh_catalog(
+    request: CatalogRequest,
+    manager: ConnectionManager = Depends(get_connection_manager),
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    load_path = Path(request.load_path)
+    if not load_path.is_dir():
+        return {"error": f"A catalog needs a dataset folder: {load_path}"}
+    
+    catalog = DatasetCatalog.get(load_path)
+    
+    async def run(job: Job) -> dict:
+        await manager.send_log("info", f"Cataloguing {load_path}", "backend", job.id)
+        # Stats every file and opens the changed ones, kept off the event loop
+        stats = await asyncio.to_thread(catalog.refresh, request.recursive)
+        await manager.send_log(
+            "success",
+            f"Catalog updated: {stats['updated']} changed, {stats['removed']} removed, {stats['files']} files",
+            "backend", job.id,
+        )
+        return {"status": "Catalog updated", "refresh": stats, "catalog": await asyncio.to_thread(catalog.summary)}
+    
+    job = job_manager.submit("catalog", run, resource_class=RESOURCE_IO, priority=request.priority)
+    return await job_response(job, request.wait)
+
+@router.get("")
+async def query_catalog(
+    load_path: str,
+    valid: Optional[bool] = None,
+    format: Optional[str] = None,
+    mode: Optional[str] = None,
+    min_width: Optional[int] = None,
+    min_height: Optional[int] = None,
+    limit: int = 100,
+    offset: int = 0,
+):
+    catalog = open_catalog(load_path)
+    if catalog is None:
+        return {"error": "No catalog for this folder, POST /catalog first"}
+    summary, images = await asyncio.gather(
+        asyncio.to_thread(catalog.summary),
+        asyncio.to_thread(catalog.query, valid, format, mode, min_width, min_height, limit, offset),
+    )
+    return {**summary, "images": images}
+
+@router.get("/resolutions")
+async def catalog_resolutions(load_path: str):
+    catalog = open_catalog(load_path)
+    if catalog is None:
+        return {"error": "No catalog for this folder, POST /catalog first"}
+    return {"resolutions": await asyncio.to_thread(catalog.resolutions)}
+
+@router.get("/duplicates")
+async def catalog_duplicates(load_path: str, max_distance: int = 0):
+    catalog = open_catalog(load_path)
+    if catalog is None:
+        return {"error": "No catalog for this folder, POST /catalog first"}
+    groups = await asyncio.to_thread(catalog.duplicates, max_distance)
+    return {"max_distance": max_distance, "groups": groups}
+
+@router.delete("")
+async def delete_catalog(load_path: str):
+    catalog = open_catalog(load_path)
+    if catalog is None:
+        return {"error": "No catalog for this folder"}
+    await asyncio.to_thread(catalog.delete)
+    return {"status": "deleted"}
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends
+from typing import Optional
+from models import ConcurrencyRequest
+from core import get_job_manager, JobManager, TrainKitException
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("")
+async def list_jobs(
+    status: Optional[str] = None,
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    return {"jobs": [job.to_dict() for job in job_manager.list_jobs(status)]}
+
+@router.get("/limits")
+async def get_limits(job_manager: JobManager = Depends(get_job_manager)):
+    return {"concurrency": job_manager.concurrency}
+
+@router.put("/limits")
+async def set_limit(
+    request: ConcurrencyRequest,
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    try:
+        job_manager.set_concurrency(request.resource_class, request.limit)
+        return {"concurrency": job_manager.concurrency}
+    except ValueError as e:
+        raise TrainKitException(str(e), status_code=400)
+
+@router.get("/{job_id}")
+async def job_status(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    job = job_manager.get(job_id)
+    if job is None:
+        return {"error": "Job not found"}
+    return job.to_dict()
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    if not job_manager.cancel(job_id):
+        return {"error": "Job not found or already finished"}
+    return {"status": "cancelling", "job_id": job_id}
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    job = job_manager.get(job_id)
+    if job is None:
+        return {"error": "Job not found"}
+    if not job.finished:
+        return {"status": job.status, "job_id": job.id}
+    if job.error is not None:
+        return {"error": job.error, "job_id": job.id}
+    return {"status": job.status, "job_id": job.id, "result": job.result}
@@ -1,8 +1,20 @@
 from fastapi import APIRouter, Depends
 from pathlib import Path
 from models import RenameRequest
-from core import get_connection_manager, get_rename_service, ConnectionManager
+from core import (
+    get_connection_manager,
+    get_rename_service,
+    get_job_manager,
+    ConnectionManager,
+    Job,
+    JobManager,
+    job_response,
+    RESOURCE_IO,
+)
+from service.catalog import DatasetCatalog
 from service.image_rename import RenameService
+from utils.metrics import JobMetrics
+from utils.profiling import JobProfiler
 
 router = APIRouter(prefix="", tags=["rename"])
 
@@ -11,36 +23,57 @@ async def rename(
     request: RenameRequest,
     manager: ConnectionManager = Depends(get_connection_manager),
     rename_service: RenameService = Depends(get_rename_service),
+    job_manager: JobManager = Depends(get_job_manager),
 ):
+    if request.mode not in ("sequential", "stem_sequential"):
+        return {"error": "Invalid mode. Use 'sequential' or 'stem_sequential'"}
+    
     load_path = Path(request.load_path)
     save_path = Path(request.save_path)
+    # Files a refreshed catalog already validated are not opened again
+    catalog = DatasetCatalog.get(load_path)
     
-    rename_service.clear_cache()
-    
-    async def progress(current: int, total: int, msg: str):
-        await manager.send_progress(current, total, msg)
-        await manager.send_log("info", msg, "backend")
-    
-    try:
-        await manager.send_log("info", f"Starting rename operation: {request.mode}", "backend")
+    async def run(job: Job) -> dict:
+        metrics = JobMetrics("rename")
+        rename_service.clear_cache()
         
-        if request.mode == "sequential":
-            await rename_service.rename_sequential(
-                load_path, save_path, 
-                skip_duplicates=request.skip_duplicates,
-                progress_callback=progress
-            )
-        elif request.mode == "stem_sequential":
-            await rename_service.rename_stem_sequential(
+        async def progress(current: int, total: int, msg: str):
+            await manager.send_progress(current, total, msg, job.id)
+            await manager.send_log("info", msg, "backend", job.id)
+        
+        await manager.send_log("info", f"Starting rename operation: {request.mode}", "backend", job.id)
+        
+        rename = (
+            rename_service.rename_sequential if request.mode == "sequential"
+            else rename_service.rename_stem_sequential
+        )
+        
+        profiler = None
+        if request.profile:
+            profiler = JobProfiler(job.id, "rename", "cprofile", request.profile_max_images)
+            await profiler.start()
+        
+        try:
+            await rename(
                 load_path, save_path,
                 skip_duplicates=request.skip_duplicates,
-                progress_callback=progress
+                progress_callback=progress,
+                cancel_token=job.cancel_token,
+                scan_options=request.scan_options(),
+                metrics=metrics,
+                profiler=profiler,
+                shard_options=request.shard_options(),
+                catalog=catalog if catalog.exists else None
             )
-        else:
-            return {"error": "Invalid mode. Use 'sequential' or 'stem_sequential'"}
+        finally:
+            if profiler:
+                await profiler.stop()
         
-        await manager.send_log("success", "Rename complete!", "backend")
-        return {"status": "Rename complete!"}
-    except Exception as e:
-        await manager.send_log("error", str(e), "backend")
-        return {"error": str(e)}
+        await manager.send_log("success", "Rename complete!", "backend", job.id)
+        result = {"status": "Rename complete!", "metrics": metrics.summary()}
+        if profiler:
+            result["profile"] = profiler.summary()
+        return result
+    
+    job = job_manager.submit("rename", run, resource_class=RESOURCE_IO, priority=request.priority)
+    return await job_response(job, request.wait)
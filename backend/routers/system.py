@@ -1,7 +1,15 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from core import get_connection_manager, get_service_manager, ConnectionManager
+from fastapi.responses import PlainTextResponse, FileResponse
+from typing import Optional
+import asyncio
+from models import MemoryBudgetRequest
+from core import get_connection_manager, get_job_manager, get_service_manager, ConnectionManager, JobManager
 from service.service_manager import ServiceManager
-from utils.image_util import get_device
+from utils.memory import MB, MemoryMonitor
+from utils.metrics import MetricsRegistry
+from utils.profiling import list_traces, get_trace_path
+from utils.decode_cache import DecodeCache
+from utils.feature_cache import FeatureCache
 
 router = APIRouter(prefix="", tags=["system"])
 
@@ -11,22 +19,89 @@ async def health():
 
 @router.get("/device")
 async def device():
+    from utils.image_util import get_device
+    
     device_info = get_device()
     return {"device": str(device_info)}
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(
+        MetricsRegistry.get_instance().render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+@router.get("/traces")
+async def traces():
+    return {"traces": list_traces()}
+
+@router.get("/traces/{name}")
+async def download_trace(name: str):
+    trace_path = get_trace_path(name)
+    if trace_path is None:
+        return {"error": "Trace not found"}
+    return FileResponse(trace_path, filename=trace_path.name)
+
+@router.get("/decode-cache")
+async def decode_cache_stats():
+    return DecodeCache.get_instance().stats()
+
+@router.delete("/decode-cache")
+async def clear_decode_cache():
+    DecodeCache.get_instance().clear()
+    return {"status": "cleared"}
+
+@router.get("/feature-cache")
+async def feature_cache_stats():
+    return FeatureCache.get_instance().stats()
+
+@router.delete("/feature-cache")
+async def clear_feature_cache():
+    FeatureCache.get_instance().clear()
+    return {"status": "cleared"}
+
+@router.get("/memory")
+async def memory(service_manager: ServiceManager = Depends(get_service_manager)):
+    # Cache stats walk their folders, kept off the event loop
+    decode_cache, feature_cache = await asyncio.gather(
+        asyncio.to_thread(DecodeCache.get_instance().stats),
+        asyncio.to_thread(FeatureCache.get_instance().stats),
+    )
+    return {
+        **MemoryMonitor.get_instance().snapshot(),
+        "models": service_manager.get_model_memory(),
+        "caches": {
+            "decode_cache_bytes": decode_cache["bytes"],
+            "feature_cache_bytes": feature_cache["bytes"],
+        },
+    }
+
+@router.put("/memory/budget")
+async def set_memory_budget(request: MemoryBudgetRequest):
+    monitor = MemoryMonitor.get_instance()
+    try:
+        monitor.set_budget(request.budget_mb * MB)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"budget_bytes": monitor.budget_bytes}
+
 @router.post("/cancel")
 async def cancel(
+    job_id: Optional[str] = None,
     manager: ConnectionManager = Depends(get_connection_manager),
-    service_manager: ServiceManager = Depends(get_service_manager),
+    job_manager: JobManager = Depends(get_job_manager),
 ):
-    try:
-        await manager.send_log("warning", "Cancelling operation and cleaning up...", "backend")
-        service_manager.cleanup()
-        await manager.send_log("info", "Cleanup complete", "backend")
-        return {"status": "cancelled"}
-    except Exception as e:
-        await manager.send_log("error", f"Cleanup error: {str(e)}", "backend")
-        return {"error": str(e)}
+    # Models stay loaded, jobs stop at their next tile, image or token
+    if job_id is not None:
+        if not job_manager.cancel(job_id):
+            return {"error": "Job not found or already finished"}
+        cancelled = [job_id]
+    else:
+        cancelled = [job.id for job in job_manager.cancel_all()]
+    
+    await manager.send_log("warning", f"Cancelling {len(cancelled)} job(s)...", "backend")
+    return {"status": "cancelled", "job_ids": cancelled}
 
 @router.websocket("/ws/progress")
 async def websocket_progress(
@@ -36,8 +111,12 @@ async def websocket_progress(
     await manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            await manager.handle_message(websocket, text)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any error ends the connection, the session and its sender task must not outlive it
         manager.disconnect(websocket)
 
 
@@ -1,16 +1,36 @@
 from fastapi import APIRouter, Depends
 from pathlib import Path
+import asyncio
 from pydantic import BaseModel
 from models import UpscaleRequest
-from core import get_connection_manager, get_service_manager, ConnectionManager
+from core import (
+    get_connection_manager,
+    get_service_manager,
+    get_job_manager,
+    ConnectionManager,
+    Job,
+    JobManager,
+    job_response,
+    RESOURCE_GPU,
+)
+from service.catalog import DatasetCatalog
 from service.service_manager import ServiceManager
-from spandrel import ModelLoader
+from utils.metrics import JobMetrics
+from utils.profiling import JobProfiler
+from utils.decode_cache import DecodeCache
+from config.image_formats import get_encoder_profiles
 
 router = APIRouter(prefix="", tags=["upscale"])
 
 class ModelInfoRequest(BaseModel):
     model_path: str
 
+def estimate_upscale_memory(service_manager: ServiceManager, model_path: Path, load_path: Path) -> int:
+    # A catalogued dataset knows its largest image, its tiled output buffers count against the budget up front
+    catalog = DatasetCatalog.get(load_path)
+    max_pixels = catalog.max_pixels() if catalog.exists else 0
+    return service_manager.estimate_memory("upscale", model_path, max_pixels)
+
 @router.post("/upscale-model-info")
 async def get_model_info(request: ModelInfoRequest):
     try:
@@ -18,6 +38,8 @@ async def get_model_info(request: ModelInfoRequest):
         if not model_path.exists():
             return {"error": "Model file not found"}
         
+        from spandrel import ModelLoader
+        
         loader = ModelLoader()
         model_descriptor = loader.load_from_file(model_path)
         
@@ -35,37 +57,80 @@ async def get_model_info(request: ModelInfoRequest):
     except Exception as e:
         return {"error": str(e)}
 
+@router.get("/encoder-profiles")
+async def encoder_profiles():
+    return {"profiles": get_encoder_profiles()}
+
+@router.get("/upscale-backends")
+async def upscale_backends():
+    from service.upscale_backends import list_upscale_backends
+    
+    return {"backends": list_upscale_backends()}
+
 @router.post("/upscale")
 async def upscale(
     request: UpscaleRequest,
     manager: ConnectionManager = Depends(get_connection_manager),
     service_manager: ServiceManager = Depends(get_service_manager),
+    job_manager: JobManager = Depends(get_job_manager),
 ):
-    try:
-        await manager.send_log("info", f"Loading upscale model from {request.upscale_model_path}", "backend")
+    async def run(job: Job) -> dict:
+        metrics = JobMetrics("upscale")
+        await manager.send_log("info", f"Loading upscale model from {request.upscale_model_path}", "backend", job.id)
         
-        # Future: Add backend selection for NCNN
-        service = service_manager.get_upscale_service(
-            model_path=Path(request.upscale_model_path)
+        # Loading, and the one-time ONNX export, stay off the event loop
+        service = await asyncio.to_thread(
+            service_manager.get_upscale_service,
+            model_path=Path(request.upscale_model_path),
+            backend=request.backend,
         )
         
         async def progress(current: int, total: int, msg: str):
-            await manager.send_progress(current, total, msg)
-            await manager.send_log("info", msg, "backend")
+            await manager.send_progress(current, total, msg, job.id)
+            await manager.send_log("info", msg, "backend", job.id)
         
-        await service.upscale_images(
-            load_path=Path(request.load_path),
-            save_path=Path(request.save_path),
-            output_format=request.format,
-            use_tiling=request.use_tiling,
-            progress_callback=progress
-        )
+        profiler = None
+        if request.profile:
+            profiler = JobProfiler(job.id, "upscale", "torch", request.profile_max_images)
+            await profiler.start()
         
-        await manager.send_log("success", "Upscaling complete!", "backend")
-        return {"status": "Upscaling complete!"}
-    except Exception as e:
-        await manager.send_log("error", str(e), "backend")
-        return {"error": str(e)}
+        try:
+            await service.upscale_images(
+                load_path=Path(request.load_path),
+                save_path=Path(request.save_path),
+                output_format=request.format,
+                use_tiling=request.use_tiling,
+                progress_callback=progress,
+                cancel_token=job.cancel_token,
+                scan_options=request.scan_options(),
+                metrics=metrics,
+                profiler=profiler,
+                encoder_profile=request.encoder_profile,
+                shard_options=request.shard_options(),
+                decode_cache=DecodeCache.get_instance() if request.decode_cache else None,
+                batch_size=request.batch_size,
+                batch_wait_s=request.batch_wait_s
+            )
+        finally:
+            if profiler:
+                await profiler.stop()
+        
+        await manager.send_log("success", "Upscaling complete!", "backend", job.id)
+        result = {"status": "Upscaling complete!", "metrics": metrics.summary()}
+        if profiler:
+            result["profile"] = profiler.summary()
+        return result
+    
+    # Walks the weights on disk, kept off the event loop
+    model_path = Path(request.upscale_model_path)
+    memory_estimate = await asyncio.to_thread(
+        estimate_upscale_memory, service_manager, model_path, Path(request.load_path)
+    )
+    job = job_manager.submit(
+        "upscale", run, resource_class=RESOURCE_GPU, priority=request.priority,
+        memory_estimate=memory_estimate, model_path=model_path,
+    )
+    return await job_response(job, request.wait)
 
 
 # future ncnn integration point:
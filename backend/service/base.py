@@ -1,10 +1,34 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional, Callable, Awaitable
+from typing import TYPE_CHECKING, Optional, Callable, Awaitable
+import threading
+
+if TYPE_CHECKING:
+    import torch
 
 #Type alias for async progress callback
 ProgressCallback = Callable[[int, int, str], Awaitable[None]]
 
+class OperationCancelled(Exception):
+    def __init__(self, message: str = "Operation cancelled"):
+        super().__init__(message)
+
+#Checked cooperatively between tiles, images and generation steps, safe to share with executor threads
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self):
+        self._event.set()
+    
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
 class BaseProcessingService(ABC):
     @abstractmethod
     async def process(
@@ -20,17 +44,22 @@ class BaseProcessingService(ABC):
     def cleanup(self) -> None:
         pass
 
-# future ncnn integration point: 
-# class NCNNUpscaleService(BaseProcessingService):  
-#     def __init__(self, ncnn_executable_path: Path, model_path: Path):
-#         self.executable = ncnn_executable_path
-#         self.model_path = model_path
-#         self._process = None
-#     
-#     async def process(self, load_path, save_path, progress_callback=None, **kwargs):
-#         pass
-#     
-#     def cleanup(self):
-#         if self._process:
-#             self._process.terminate()
-#             self._process = None
+#Runs NCHW float batches in [0, 1] through an upscale model, tiling, batching and encoding stay in the upscale service
+class UpscaleBackend(ABC):
+    name: str = ""
+    #Backends that cannot use the app device get their inputs on CPU
+    cpu_only: bool = False
+    #False once the backend holds its own copy of the weights, the eager model is dropped then
+    needs_model: bool = True
+
+    @abstractmethod
+    def __call__(self, batch: "torch.Tensor") -> "torch.Tensor":
+        pass
+    
+    @abstractmethod
+    def model_bytes(self) -> int:
+        pass
+    
+    @abstractmethod
+    def cleanup(self) -> None:
+        pass
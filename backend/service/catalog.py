@@ -0,0 +1,297 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from utils.feature_cache import content_hash
+from utils.scanner import ScanEntry, scan_dataset
+
+# One SQLite file per dataset folder, outside the dataset so read-only folders can be catalogued
+CATALOG_DIR = Path(os.environ.get("TRAINKIT_CATALOG_DIR", Path(tempfile.gettempdir()) / "trainkit" / "catalog"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    valid INTEGER NOT NULL,
+    format TEXT,
+    width INTEGER,
+    height INTEGER,
+    mode TEXT,
+    content_hash TEXT,
+    dhash TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS images_resolution ON images (width, height);
+CREATE INDEX IF NOT EXISTS images_content_hash ON images (content_hash);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+COLUMNS = ("path", "size", "mtime", "valid", "format", "width", "height", "mode", "content_hash", "dhash", "error")
+
+# Side of the difference hash grid, 8 gives 64 bit hashes
+DHASH_SIZE = 8
+
+
+def dhash(image) -> str:
+    from PIL import Image
+
+    # JPEGs decode at a fraction of their size, the hash only needs a thumbnail
+    image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+    small = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+
+    # One bit per horizontal neighbour pair, robust to rescaling and re-encoding
+    bits = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+
+class DatasetCatalog:
+    _instances: Dict[Path, "DatasetCatalog"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, root: Path, catalog_dir: Path = CATALOG_DIR):
+        self.root = root.resolve()
+        key = hashlib.blake2b(str(self.root).encode("utf-8"), digest_size=10).hexdigest()
+        self.db_path = catalog_dir / f"{self.root.name}-{key}.sqlite"
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def get(cls, root: Path) -> "DatasetCatalog":
+        root = root.resolve()
+        with cls._instances_lock:
+            if root not in cls._instances:
+                cls._instances[root] = cls(root)
+            return cls._instances[root]
+
+    @property
+    def exists(self) -> bool:
+        return self.db_path.exists()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Shared by executor threads, every access goes through self._lock
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def refresh(self, recursive: bool = False, workers: Optional[int] = None) -> dict:
+        # Only files whose size or mtime changed are opened again, an unchanged dataset costs one stat per file
+        if not self.root.is_dir():
+            raise ValueError(f"A catalog needs a dataset folder: {self.root}")
+
+        start = time.perf_counter()
+        known = {row["path"]: (row["size"], row["mtime"]) for row in self._query("SELECT path, size, mtime FROM images")}
+
+        seen = set()
+        changed: List[ScanEntry] = []
+        for entry in scan_dataset(self.root, recursive=recursive):
+            path = entry.relative_path.as_posix()
+            seen.add(path)
+            if known.get(path) != (entry.size, entry.mtime):
+                changed.append(entry)
+        removed = [(path,) for path in known.keys() - seen]
+
+        # PIL decodes and hashing release the GIL
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+            rows = list(pool.map(self._inspect, changed))
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO images ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows,
+                )
+                conn.executemany("DELETE FROM images WHERE path = ?", removed)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("refreshed_at", str(time.time())), ("recursive", str(int(recursive)))],
+                )
+
+        return {
+            "files": len(seen),
+            "updated": len(changed),
+            "removed": len(removed),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _inspect(self, entry: ScanEntry) -> tuple:
+        from PIL import Image
+
+        image_format = mode = image_hash = error = None
+        width = height = None
+        try:
+            with Image.open(entry.path) as image:
+                image_format, mode = image.format, image.mode
+                width, height = image.size
+                image.verify()
+            valid = True
+        except Exception as e:
+            valid = False
+            error = str(e)
+
+        # Validity is what verify() says, the same check rename runs, a file that fails to decode only loses its hash
+        if valid:
+            try:
+                # verify() leaves the image unusable, the hash needs a fresh decode
+                with Image.open(entry.path) as image:
+                    image_hash = dhash(image)
+            except Exception as e:
+                error = f"dhash: {e}"
+
+        return (
+            entry.relative_path.as_posix(), entry.size, entry.mtime, int(valid),
+            image_format, width, height, mode, content_hash(entry), image_hash, error,
+        )
+
+    def validity(self) -> Dict[str, Tuple[int, float, bool]]:
+        # path -> (size, mtime, valid), callers trust a row only while size and mtime still match
+        return {
+            row["path"]: (row["size"], row["mtime"], bool(row["valid"]))
+            for row in self._query("SELECT path, size, mtime, valid FROM images")
+        }
+
+    @staticmethod
+    def known_valid(known: Dict[str, Tuple[int, float, bool]], entry: ScanEntry) -> Optional[bool]:
+        # None when the file is not catalogued or changed since, the caller opens it then
+        record = known.get(entry.relative_path.as_posix())
+        if record is None or record[:2] != (entry.size, entry.mtime):
+            return None
+        return record[2]
+
+    def query(
+        self,
+        valid: Optional[bool] = None,
+        image_format: Optional[str] = None,
+        mode: Optional[str] = None,
+        min_width: Optional[int] = None,
+        min_height: Optional[int] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[dict]:
+        conditions, params = [], []
+        for clause, value in (
+            ("valid = ?", None if valid is None else int(valid)),
+            ("format = ?", image_format.upper() if image_format else None),
+            ("mode = ?", mode),
+            ("width >= ?", min_width),
+            ("height >= ?", min_height),
+        ):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._query(
+            f"SELECT * FROM images {where} ORDER BY path LIMIT ? OFFSET ?",
+            tuple(params) + (limit, offset),
+        )
+        return [dict(row) for row in rows]
+
+    def resolutions(self) -> List[dict]:
+        # Same-size groups, what the upscale batcher buckets on
+        rows = self._query(
+            "SELECT width, height, COUNT(*) AS count FROM images WHERE valid = 1 "
+            "GROUP BY width, height ORDER BY count DESC, width, height"
+        )
+        return [dict(row) for row in rows]
+
+    def max_pixels(self) -> int:
+        row = self._query("SELECT MAX(width * height) AS pixels FROM images WHERE valid = 1")[0]
+        return row["pixels"] or 0
+
+    def duplicates(self, max_distance: int = 0) -> List[List[str]]:
+        # 0 groups identical bytes, above 0 groups images whose dHashes differ in at most max_distance bits
+        if max_distance <= 0:
+            rows = self._query(
+                "SELECT content_hash, GROUP_CONCAT(path, char(10)) AS paths FROM images "
+                "GROUP BY content_hash HAVING COUNT(*) > 1"
+            )
+            return [sorted(row["paths"].split("\n")) for row in rows]
+
+        rows = self._query("SELECT path, dhash FROM images WHERE valid = 1 AND dhash IS NOT NULL")
+        return self._near_duplicates([(row["path"], row["dhash"]) for row in rows], max_distance)
+
+    def _near_duplicates(self, hashes: List[Tuple[str, str]], max_distance: int) -> List[List[str]]:
+        # Pigeonhole: split the hash into max_distance + 1 bands, near matches share at least one band exactly
+        bits = DHASH_SIZE * DHASH_SIZE
+        bands = min(max_distance + 1, bits)
+        edges = [bits * band // bands for band in range(bands + 1)]
+
+        parent = list(range(len(hashes)))
+
+        def find(idx: int) -> int:
+            while parent[idx] != idx:
+                parent[idx] = parent[parent[idx]]
+                idx = parent[idx]
+            return idx
+
+        values = [int(image_hash, 16) for _, image_hash in hashes]
+        for band in range(bands):
+            width = edges[band + 1] - edges[band]
+            buckets: Dict[int, List[int]] = {}
+            for idx, value in enumerate(values):
+                key = (value >> (bits - edges[band + 1])) & ((1 << width) - 1)
+                buckets.setdefault(key, []).append(idx)
+
+            for members in buckets.values():
+                for pos, left in enumerate(members):
+                    for right in members[pos + 1:]:
+                        if find(left) != find(right) and bin(values[left] ^ values[right]).count("1") <= max_distance:
+                            parent[find(right)] = find(left)
+
+        groups: Dict[int, List[str]] = {}
+        for idx, (path, _) in enumerate(hashes):
+            groups.setdefault(find(idx), []).append(path)
+        return [sorted(paths) for paths in groups.values() if len(paths) > 1]
+
+    def summary(self) -> dict:
+        if not self.exists:
+            return {"root": str(self.root), "exists": False}
+
+        totals = self._query(
+            "SELECT COUNT(*) AS files, COALESCE(SUM(valid), 0) AS valid, COALESCE(SUM(size), 0) AS bytes FROM images"
+        )[0]
+        formats = self._query("SELECT format, COUNT(*) AS count FROM images WHERE valid = 1 GROUP BY format")
+        modes = self._query("SELECT mode, COUNT(*) AS count FROM images WHERE valid = 1 GROUP BY mode")
+        meta = {row["key"]: row["value"] for row in self._query("SELECT key, value FROM meta")}
+        return {
+            "root": str(self.root),
+            "exists": True,
+            "catalog_path": str(self.db_path),
+            "files": totals["files"],
+            "valid": totals["valid"],
+            "invalid": totals["files"] - totals["valid"],
+            "bytes": totals["bytes"],
+            "formats": {row["format"]: row["count"] for row in formats},
+            "modes": {row["mode"]: row["count"] for row in modes},
+            "max_pixels": self.max_pixels(),
+            "recursive": meta.get("recursive") == "1",
+            "refreshed_at": float(meta["refreshed_at"]) if "refreshed_at" in meta else None,
+        }
+
+    def delete(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.db_path}{suffix}").unlink(missing_ok=True)
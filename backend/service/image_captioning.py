@@ -1,9 +1,25 @@
 import torch
 from PIL import Image
-from transformers import AutoProcessor, LlavaForConditionalGeneration, GenerationConfig
-from pathlib import Path
-from typing import Optional, Callable, Awaitable
+from transformers import (
+    AutoProcessor,
+    LlavaForConditionalGeneration,
+    GenerationConfig,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
+from pathlib import Path, PurePosixPath
+from typing import Optional, Callable, Awaitable, Union, Dict
 from config.image_formats import SUPPORTED_INPUT_EXTENSIONS
+from utils.scanner import DatasetScanner, ScanEntry
+from utils.shards import OutputWriter, open_output
+from utils.decode_cache import DecodeCache
+from utils.feature_cache import FeatureCache, content_hash, model_key
+from utils.image_util import get_cpu_threads
+from utils.memory import module_bytes
+from utils.metrics import JobMetrics
+from utils.profiling import JobProfiler
+from .base import CancellationToken
+import numpy as np
 import asyncio
 import gc
 
@@ -12,11 +28,25 @@ Image.MAX_IMAGE_PIXELS = None
 # Type alias for async progress callback
 ProgressCallback = Callable[[int, int, str], Awaitable[None]]
 
+class CancellationCriteria(StoppingCriteria):
+    def __init__(self, cancel_token: CancellationToken):
+        self.cancel_token = cancel_token
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        # Checked after every generated token
+        return torch.full(
+            (input_ids.shape[0],), self.cancel_token.cancelled, dtype=torch.bool, device=input_ids.device
+        )
+
 class ImageCaptioningService:
-    def __init__(self, model: Path, max_new_tokens=512, temperature=0.6, top_p=0.9, top_k=None):
+    def __init__(self, model: Path, max_new_tokens=512, temperature=0.6, top_p=0.9, top_k=None, quantize=None):
         self.model_path = model
+        self.quantize = self.resolve_quantize(quantize)
         self._model = None
         self._processor = None
+        self._feature_key = None
+        self._assistant = None
+        self._assistant_path: Optional[Path] = None
         self._generation_config = GenerationConfig(
             max_new_tokens=max_new_tokens,
             do_sample=True,
@@ -40,21 +70,235 @@ class ImageCaptioningService:
         if progress_callback:
             await progress_callback(1, 1, "Model loaded successfully")
     
+    @staticmethod
+    def resolve_quantize(quantize: Optional[bool]) -> bool:
+        # None quantizes on CPU-only hosts, dynamic int8 kernels only exist for CPU
+        return not torch.cuda.is_available() and quantize is not False
+    
     def _load_model_sync(self, model_path):
         print(f"Loading model from {model_path}...")
+        if not torch.cuda.is_available():
+            torch.set_num_threads(get_cpu_threads("TRAINKIT_TORCH_THREADS"))
+            print(f"CPU inference with {torch.get_num_threads()} threads")
+        model = self._load_llava(model_path)
+        processor = AutoProcessor.from_pretrained(model_path)
+        print("Model loaded successfully")
+        return model, processor
+    
+    def _load_llava(self, model_path):
         model = LlavaForConditionalGeneration.from_pretrained(
             model_path, 
             torch_dtype=torch.bfloat16, 
             device_map="auto"
         )
-        processor = AutoProcessor.from_pretrained(model_path)
         model.eval()
-        print("Model loaded successfully")
-        return model, processor
+        if self.quantize:
+            self._quantize_language_model(model)
+        return model
+    
+    def _quantize_language_model(self, model):
+        # Layer by layer, only one linear is upcast to float32 at a time instead of the whole model
+        qconfig = torch.ao.quantization.default_dynamic_qconfig
+        for name, module in list(model.named_modules()):
+            if not isinstance(module, torch.nn.Linear):
+                continue
+            # The vision tower and projector stay in float, their outputs are sensitive to int8 weights
+            if "language_model" not in name and name.rsplit(".", 1)[-1] != "lm_head":
+                continue
+            module.float()
+            module.qconfig = qconfig
+            parent_name, _, child_name = name.rpartition(".")
+            setattr(model.get_submodule(parent_name), child_name, torch.ao.nn.quantized.dynamic.Linear.from_float(module))
+        
+        # Quantized linears take float32 activations, and CPUs without bf16 units run float32 faster anyway
+        model.float()
+        print(f"Language model quantized to int8, {module_bytes(model) / 1024 ** 3:.2f} GB")
+    
+    def model_summary(self) -> dict:
+        return {
+            "quantized": self.quantize,
+            "device": str(self._model.device) if self._model is not None else None,
+            "dtype": str(self._model.dtype) if self._model is not None else None,
+            "bytes": module_bytes(self._model),
+            "threads": torch.get_num_threads(),
+        }
+    
+    async def _decoding_kwargs(
+        self,
+        assistant_model_path: Optional[Path],
+        prompt_lookup_num_tokens: Optional[int],
+        feature_cache: Optional[FeatureCache],
+        progress_callback: Optional[ProgressCallback]
+    ) -> Dict:
+        # Extra generate() arguments, falls through to prompt lookup and then to standard decoding
+        if assistant_model_path is not None:
+            if feature_cache:
+                # The draft model embeds the image itself, cached features only fit the main model
+                await self._report(progress_callback, "Assistant model is not used with the feature cache")
+            else:
+                assistant = await self._load_assistant_async(assistant_model_path, progress_callback)
+                if assistant is not None:
+                    return {"assistant_model": assistant}
+        
+        if prompt_lookup_num_tokens:
+            return {"prompt_lookup_num_tokens": prompt_lookup_num_tokens}
+        return {}
+    
+    async def _report(self, progress_callback: Optional[ProgressCallback], msg: str):
+        print(msg)
+        if progress_callback:
+            await progress_callback(0, 1, msg)
+    
+    async def _load_assistant_async(self, model_path: Path, progress_callback: Optional[ProgressCallback]):
+        if self._assistant is not None and self._assistant_path == model_path:
+            return self._assistant
+        
+        self._unload_assistant()
+        await self._report(progress_callback, f"Loading assistant model from {model_path}...")
+        
+        loop = asyncio.get_event_loop()
+        try:
+            assistant = await loop.run_in_executor(None, self._load_llava, model_path)
+        except Exception as e:
+            await self._report(progress_callback, f"Could not load assistant model, using standard decoding: {e}")
+            return None
+        
+        mismatch = self._assistant_mismatch(assistant)
+        if mismatch:
+            del assistant
+            gc.collect()
+            await self._report(progress_callback, f"Assistant model is incompatible ({mismatch}), using standard decoding")
+            return None
+        
+        self._assistant = assistant
+        self._assistant_path = model_path
+        return assistant
+    
+    def _assistant_mismatch(self, assistant) -> Optional[str]:
+        # Drafts are verified token by token, so the vocabulary and the image token expansion must match
+        config = self._model.config
+        draft_config = assistant.config
+        if config.text_config.vocab_size != draft_config.text_config.vocab_size:
+            return f"vocabulary {draft_config.text_config.vocab_size} vs {config.text_config.vocab_size}"
+        if self._image_token_id(config) != self._image_token_id(draft_config):
+            return "different image token"
+        
+        for name in ("image_size", "patch_size"):
+            value = getattr(config.vision_config, name)
+            draft_value = getattr(draft_config.vision_config, name)
+            if value != draft_value:
+                return f"vision {name} {draft_value} vs {value}"
+        if config.vision_feature_select_strategy != draft_config.vision_feature_select_strategy:
+            return "different image feature selection"
+        return None
+    
+    def _unload_assistant(self):
+        if self._assistant is not None:
+            del self._assistant
+            self._assistant = None
+            self._assistant_path = None
+            gc.collect()
+    
+    def _image_inputs(
+        self,
+        entry: ScanEntry,
+        prompt: str,
+        metrics: Optional[JobMetrics] = None,
+        decode_cache: Optional[DecodeCache] = None,
+        feature_cache: Optional[FeatureCache] = None
+    ):
+        metrics = metrics or JobMetrics("caption")
+        
+        if feature_cache:
+            return self._feature_inputs(entry, prompt, metrics, decode_cache, feature_cache)
+        
+        image = self._load_image(entry, metrics, decode_cache)
+        with metrics.stage("preprocess"):
+            return self._prepare_inputs(image, prompt)
+    
+    def _load_image(self, entry: ScanEntry, metrics: JobMetrics, decode_cache: Optional[DecodeCache]):
+        if decode_cache:
+            return decode_cache.get_or_decode(entry, lambda: self._decode_image(entry, metrics), metrics)
+        return self._decode_image(entry, metrics)
+    
+    def _feature_inputs(
+        self,
+        entry: ScanEntry,
+        prompt: str,
+        metrics: JobMetrics,
+        decode_cache: Optional[DecodeCache],
+        feature_cache: FeatureCache
+    ):
+        with metrics.stage("validate"):
+            image_key = content_hash(entry)
+        features = feature_cache.get(self._feature_model_key, image_key)
+        
+        if features is not None:
+            # Only the prompt is tokenized, the image is never decoded
+            metrics.count("feature_cache_hits")
+            with metrics.stage("preprocess"):
+                inputs = self._prompt_inputs(prompt, features.shape[0])
+        else:
+            image = self._load_image(entry, metrics, decode_cache)
+            with metrics.stage("preprocess"):
+                inputs = self._prepare_inputs(image, prompt)
+            with metrics.stage("inference"):
+                features = self._vision_features(inputs.pop("pixel_values"))
+            feature_cache.put(self._feature_model_key, image_key, features)
+        
+        with metrics.stage("preprocess"):
+            return self._embed_inputs(inputs, features)
     
-    def _image_inputs(self, image_path: Path, prompt: str):
-        image = Image.open(image_path).convert('RGB')
+    @property
+    def _feature_model_key(self) -> str:
+        if self._feature_key is None:
+            self._feature_key = model_key(
+                str(Path(self.model_path).resolve()),
+                self._model.config.to_json_string(),
+                self._processor.image_processor.to_json_string(),
+                str(self._model.dtype),
+            )
+        return self._feature_key
+    
+    def _vision_features(self, pixel_values):
+        # Vision tower + projector output, exactly what LLaVA scatters into the image token positions
+        config = self._model.config
+        with torch.no_grad():
+            features = self._model.get_image_features(
+                pixel_values=pixel_values,
+                vision_feature_layer=config.vision_feature_layer,
+                vision_feature_select_strategy=config.vision_feature_select_strategy,
+            )
+        # Newer transformers return one tensor per image
+        if isinstance(features, (list, tuple)):
+            features = torch.cat(list(features), dim=0)
+        return features.reshape(-1, features.shape[-1])
+    
+    def _embed_inputs(self, inputs: dict, features) -> dict:
+        input_ids = inputs["input_ids"]
+        image_token_id = self._image_token_id(self._model.config)
+        
+        with torch.no_grad():
+            embeds = self._model.get_input_embeddings()(input_ids)
+            mask = (input_ids == image_token_id).unsqueeze(-1).expand_as(embeds)
+            embeds = embeds.masked_scatter(mask, features.to(embeds.device, embeds.dtype))
         
+        # input_ids stay so generate() returns prompt + caption like the pixel_values path
+        return {"input_ids": input_ids, "attention_mask": inputs["attention_mask"], "inputs_embeds": embeds}
+    
+    @staticmethod
+    def _image_token_id(config) -> int:
+        return getattr(config, "image_token_id", None) or config.image_token_index
+    
+    def _decode_image(self, entry: ScanEntry, metrics: JobMetrics) -> Image.Image:
+        with entry.open() as file:
+            with metrics.stage("validate"):
+                image = Image.open(file)
+            with metrics.stage("decode"):
+                image = image.convert('RGB')
+        return image
+        
+    def _format_prompt(self, prompt: str) -> str:
         messages = [
             {
                 "role": "system",
@@ -70,91 +314,223 @@ class ImageCaptioningService:
             }
         ]
         
-        formatted_prompt = self._processor.apply_chat_template(
+        return self._processor.apply_chat_template(
             messages,
             tokenize=False,
             add_generation_prompt=True
         )
-        
+    
+    def _prepare_inputs(self, image: Union[Image.Image, np.ndarray], prompt: str):
         # Process image and text into model-ready tensors
         inputs = self._processor(
-            text=[formatted_prompt],
+            text=[self._format_prompt(prompt)],
             images=[image],
             return_tensors="pt"
         )
-        
+        return self._to_device(inputs)
+    
+    def _prompt_inputs(self, prompt: str, num_image_tokens: int):
+        # Same expansion the processor applies, one placeholder per cached feature vector
+        image_token = self._processor.image_token
+        text = self._format_prompt(prompt).replace(image_token, image_token * num_image_tokens)
+        inputs = self._processor.tokenizer([text], return_tensors="pt")
+        return self._to_device(inputs)
+    
+    def _to_device(self, inputs) -> dict:
         # Move to GPU if available
         if torch.cuda.is_available():
             inputs = {k: v.to('cuda') if hasattr(v, 'to') else v 
                      for k, v in inputs.items()}
             
-            if 'pixel_values' in inputs:
-                inputs['pixel_values'] = inputs['pixel_values'].to(torch.bfloat16)
+        # The vision tower runs in the model dtype, bf16 on GPU and unquantized CPU, float32 once quantized
+        if 'pixel_values' in inputs:
+            inputs['pixel_values'] = inputs['pixel_values'].to(self._model.dtype)
     
         return inputs
     
-    def _generate_caption(self, inputs: dict):
+    def _generate_caption(
+        self,
+        inputs: dict,
+        cancel_token: Optional[CancellationToken] = None,
+        metrics: Optional[JobMetrics] = None,
+        decoding: Optional[Dict] = None
+    ):
+        metrics = metrics or JobMetrics("caption")
         print("Generation Captions")
+        
+        stopping_criteria = None
+        if cancel_token:
+            stopping_criteria = StoppingCriteriaList([CancellationCriteria(cancel_token)])
     
-        generated_ids = self._model.generate(
-            **inputs,
-            generation_config=self._generation_config,
-        )[0]
+        with metrics.stage("inference"):
+            generated_ids = self._generate(inputs, stopping_criteria, metrics, decoding)[0]
+        
+        # A generation stopped by cancellation is incomplete, never save it
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
         
         input_length = inputs['input_ids'].shape[1]
         generated_ids = generated_ids[input_length:]
+        metrics.count("tokens", generated_ids.shape[0])
         
-        caption = self._processor.tokenizer.decode(
-            generated_ids,
-            skip_special_tokens= True,
-            clean_up_tokenization_spaces= False 
-        )
+        with metrics.stage("postprocess"):
+            caption = self._processor.tokenizer.decode(
+                generated_ids,
+                skip_special_tokens= True,
+                clean_up_tokenization_spaces= False 
+            )
         
         return caption.strip()
     
+    def _generate(self, inputs: dict, stopping_criteria, metrics: JobMetrics, decoding: Optional[Dict]):
+        try:
+            return self._model.generate(
+                **inputs,
+                generation_config=self._generation_config,
+                stopping_criteria=stopping_criteria,
+                **(decoding or {}),
+            )
+        except (ValueError, TypeError, NotImplementedError) as e:
+            if not decoding:
+                raise
+            # generate() rejects unsupported assisted setups up front, the rest of the job decodes normally
+            print(f"Assisted decoding failed, falling back to standard decoding: {e}")
+            decoding.clear()
+            metrics.count("decoding_fallbacks")
+            return self._model.generate(
+                **inputs,
+                generation_config=self._generation_config,
+                stopping_criteria=stopping_criteria,
+            )
+    
+    def decoding_stats(self, metrics: JobMetrics, mode: str) -> dict:
+        summary = metrics.summary()
+        counters = summary["counters"]
+        tokens = counters.get("tokens", 0)
+        forwards = counters.get("target_forwards", 0)
+        inference_s = summary["stages"].get("inference", {}).get("total_s", 0)
+        stats = {
+            "mode": mode,
+            "tokens": tokens,
+            "tokens_per_s": round(tokens / inference_s, 2) if inference_s else 0,
+            "target_forwards": forwards,
+            # 1.0 is plain decoding, every accepted draft token saves one main model forward
+            "tokens_per_forward": round(tokens / forwards, 3) if forwards else 0,
+            "fallbacks": counters.get("decoding_fallbacks", 0),
+        }
+        
+        # Every assistant forward proposes one draft token, prompt lookup drafts are not observable
+        draft_tokens = counters.get("draft_tokens", 0)
+        if draft_tokens:
+            stats["draft_tokens"] = draft_tokens
+            stats["acceptance_rate"] = round(max(tokens - forwards, 0) / draft_tokens, 3)
+        return stats
+    
     async def caption_images(
         self,
         load_path: Path,
         save_path: Path,
         prompt: str,
-        progress_callback: Optional[ProgressCallback] = None
-    ):
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        scan_options: Optional[dict] = None,
+        metrics: Optional[JobMetrics] = None,
+        profiler: Optional[JobProfiler] = None,
+        shard_options: Optional[dict] = None,
+        decode_cache: Optional[DecodeCache] = None,
+        feature_cache: Optional[FeatureCache] = None,
+        assistant_model_path: Optional[Path] = None,
+        prompt_lookup_num_tokens: Optional[int] = None
+    ) -> dict:
+        metrics = metrics or JobMetrics("caption")
         await self._load_model_async(progress_callback)
+        decoding = await self._decoding_kwargs(
+            assistant_model_path, prompt_lookup_num_tokens, feature_cache, progress_callback
+        )
+        mode = "assistant" if "assistant_model" in decoding else "prompt_lookup" if decoding else "standard"
         
-        files = [f for f in load_path.iterdir() 
-            if f.is_file() and f.suffix.lower() in SUPPORTED_INPUT_EXTENSIONS]
+        scanner = DatasetScanner(load_path, extensions=SUPPORTED_INPUT_EXTENSIONS, **(scan_options or {}))
+        writer = open_output(save_path, "caption", shard_options)
+        print(f"Scanning {load_path} for images to caption")
         
-        total = len(files)
-        print(f"Found {total} images to caption")
+        # Forward counts give tokens per forward and the draft acceptance rate
+        hooks = [self._model.register_forward_hook(lambda *_: metrics.count("target_forwards"))]
+        if "assistant_model" in decoding:
+            hooks.append(decoding["assistant_model"].register_forward_hook(lambda *_: metrics.count("draft_tokens")))
         
-        for idx, img_file in enumerate(files, 1):
+        try:
+            idx = await self._caption_entries(
+                scanner, writer, prompt, progress_callback, cancel_token, metrics, profiler,
+                decode_cache, feature_cache, decoding
+            )
+        finally:
+            for hook in hooks:
+                hook.remove()
+            writer.close()
+            if decode_cache:
+                decode_cache.flush()
+        
+        metrics.record("scan", scanner.scan_seconds)
+        print(f"Captioning complete! Processed {idx} images")
+        return self.decoding_stats(metrics, mode)
+    
+    async def _caption_entries(
+        self,
+        scanner: DatasetScanner,
+        writer: OutputWriter,
+        prompt: str,
+        progress_callback: Optional[ProgressCallback],
+        cancel_token: Optional[CancellationToken],
+        metrics: JobMetrics,
+        profiler: Optional[JobProfiler],
+        decode_cache: Optional[DecodeCache],
+        feature_cache: Optional[FeatureCache],
+        decoding: Dict
+    ) -> int:
+        idx = 0
+        async for entry in scanner:
+            idx += 1
+            img_file = entry.path
+            
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            
             if progress_callback:
-                await progress_callback(idx, total, f"Captioning {img_file.name}")
+                await progress_callback(idx, scanner.total, f"Captioning {img_file.name}")
             
-            print(f"Processing {idx}/{total}: {img_file.name}")
+            print(f"Processing {idx}/{scanner.total}: {img_file.name}")
             
-            # Run CPU-bound work in executor to not block event loop
+            # Run CPU-bound work in executor to not block event loop, profiled jobs use the profiler's worker thread
             loop = asyncio.get_event_loop()
-            inputs = await loop.run_in_executor(None, self._image_inputs, img_file, prompt)
-            caption = await loop.run_in_executor(None, self._generate_caption, inputs)
-            await loop.run_in_executor(None, self.save_caption, caption, img_file, save_path)
+            executor = profiler.executor if profiler else None
+            inputs = await loop.run_in_executor(
+                executor, self._image_inputs, entry, prompt, metrics, decode_cache, feature_cache
+            )
+            metrics.count("bytes_read", entry.size)
+            caption = await loop.run_in_executor(
+                executor, self._generate_caption, inputs, cancel_token, metrics, decoding
+            )
+            
+            with metrics.stage("write"):
+                await loop.run_in_executor(executor, self.save_caption, caption, writer, entry.relative_path)
+            metrics.count("images")
+            
+            if profiler:
+                await profiler.step()
         
-        print(f"Captioning complete! Processed {total} images")
+        return idx
     
-    def save_caption(self, caption, image_path: Path, output_dir: Path = None):
-        if output_dir:
-            output_dir.mkdir(parents=True, exist_ok=True)
-            output_file = output_dir / f"{image_path.stem}.txt"
-        else:
-            output_file = image_path.with_suffix('.txt')
-        
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(caption)
+    def save_caption(self, caption: str, writer: OutputWriter, image_name: PurePosixPath):
+        # Caption sits next to its image under the same stem, the WebDataset sample layout
+        output_file = writer.write(image_name.with_suffix('.txt'), caption.encode('utf-8'))
         
         print(f"Caption saved to: {output_file}")
         return output_file
     
     def cleanup(self):
+        if hasattr(self, '_assistant'):
+            self._unload_assistant()
+        
         if hasattr(self, '_model') and self._model is not None:
             # Move model to CPU first to free GPU memory
             try:
@@ -1,74 +1,171 @@
-from pathlib import Path
-from typing import Set, Optional, Callable, Awaitable
+from pathlib import Path, PurePosixPath
+from typing import Dict, Set, Optional, Callable, Awaitable, Tuple
 import asyncio
-import shutil
-import difPy
 from utils.file_util import is_image
+from utils.scanner import DatasetScanner, ScanEntry
+from utils.shards import OutputWriter, open_output
+from utils.metrics import JobMetrics
+from utils.profiling import JobProfiler
+from .base import CancellationToken
+from .catalog import DatasetCatalog
 
 # Type alias for async progress callback
 ProgressCallback = Callable[[int, int, str], Awaitable[None]]
 
+# Builds the new file name from the entry and its 1-based index
+NameBuilder = Callable[[ScanEntry, int], str]
+
 class RenameService:
     def __init__(self):
         self._duplicates_cache: Optional[Set[Path]] = None
     
-    def list_files(self, load_path: Path):
-        return list(load_path.iterdir())
-
     async def rename_sequential(
         self,
         load_path: Path,
         save_path: Path,
         skip_duplicates: bool = False,
-        progress_callback: Optional[ProgressCallback] = None
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        scan_options: Optional[dict] = None,
+        metrics: Optional[JobMetrics] = None,
+        profiler: Optional[JobProfiler] = None,
+        shard_options: Optional[dict] = None,
+        catalog: Optional[DatasetCatalog] = None
     ):
-        files = list(self.get_valid_files(load_path, skip_duplicates))
-        total = len(files)
-        
-        print(f"Found {total} files to rename")
-        
-        for idx, file in enumerate(files, start=1):
-            if progress_callback:
-                await progress_callback(idx, total, f"Renaming {file.name}")
-            
-            new_name = f"{idx}{file.suffix}"
-            new_path = save_path / new_name
-            
-            # Run I/O in executor to not block event loop
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, shutil.copy2, file, new_path)
-        
-        print(f"Rename complete! Processed {total} files")
+        await self._rename(
+            load_path, save_path,
+            lambda entry, idx: f"{idx}{entry.path.suffix}",
+            skip_duplicates, progress_callback, cancel_token, scan_options, metrics, profiler, shard_options, catalog
+        )
     
     async def rename_stem_sequential(
         self,
         load_path: Path,
         save_path: Path,
         skip_duplicates: bool = False,
-        progress_callback: Optional[ProgressCallback] = None
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        scan_options: Optional[dict] = None,
+        metrics: Optional[JobMetrics] = None,
+        profiler: Optional[JobProfiler] = None,
+        shard_options: Optional[dict] = None,
+        catalog: Optional[DatasetCatalog] = None
     ):
-        files = list(self.get_valid_files(load_path, skip_duplicates))
-        total = len(files)
+        await self._rename(
+            load_path, save_path,
+            lambda entry, idx: f"{entry.path.stem}_{idx}{entry.path.suffix}",
+            skip_duplicates, progress_callback, cancel_token, scan_options, metrics, profiler, shard_options, catalog
+        )
+    
+    async def _rename(
+        self,
+        load_path: Path,
+        save_path: Path,
+        build_name: NameBuilder,
+        skip_duplicates: bool,
+        progress_callback: Optional[ProgressCallback],
+        cancel_token: Optional[CancellationToken],
+        scan_options: Optional[dict],
+        metrics: Optional[JobMetrics],
+        profiler: Optional[JobProfiler],
+        shard_options: Optional[dict],
+        catalog: Optional[DatasetCatalog] = None
+    ):
+        metrics = metrics or JobMetrics("rename")
+        scanner = DatasetScanner(load_path, **(scan_options or {}))
+        loop = asyncio.get_event_loop()
+        
+        # Catalogued validity of unchanged files, everything else is opened and checked as before
+        known = {}
+        if catalog is not None and not scanner.archived:
+            known = await loop.run_in_executor(None, catalog.validity)
         
-        print(f"Found {total} files to rename")
+        duplicates = set()
+        if skip_duplicates:
+            if scanner.archived:
+                raise ValueError("Duplicate detection needs a folder of images, not archive shards")
+            with metrics.stage("validate"):
+                duplicates = await loop.run_in_executor(None, self.skip_duplicates, load_path, scanner.recursive)
+        
+        print(f"Scanning {load_path} for files to rename")
         
-        for idx, file in enumerate(files, start=1):
+        writer = open_output(save_path, "rename", shard_options)
+        try:
+            idx = await self._rename_entries(
+                scanner, writer, build_name, duplicates, progress_callback, cancel_token, metrics, profiler, known
+            )
+        finally:
+            writer.close()
+        
+        metrics.record("scan", scanner.scan_seconds)
+        print(f"Rename complete! Processed {idx} files")
+    
+    async def _rename_entries(
+        self,
+        scanner: DatasetScanner,
+        writer: OutputWriter,
+        build_name: NameBuilder,
+        duplicates: Set[Path],
+        progress_callback: Optional[ProgressCallback],
+        cancel_token: Optional[CancellationToken],
+        metrics: JobMetrics,
+        profiler: Optional[JobProfiler],
+        known: Dict[str, Tuple[int, float, bool]]
+    ) -> int:
+        loop = asyncio.get_event_loop()
+        idx = 0
+        async for entry in scanner:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            
+            # Validation opens the file, keep it off the event loop
+            if entry.path in duplicates:
+                continue
+            executor = profiler.executor if profiler else None
+            valid = DatasetCatalog.known_valid(known, entry)
+            if valid is not None:
+                metrics.count("catalog_hits")
+            else:
+                with metrics.stage("validate"):
+                    valid = await loop.run_in_executor(executor, self._is_valid, entry)
+            if not valid:
+                continue
+            
+            idx += 1
             if progress_callback:
-                await progress_callback(idx, total, f"Renaming {file.name}")
+                await progress_callback(idx, scanner.total, f"Renaming {entry.name}")
             
-            new_name = f"{file.stem}_{idx}{file.suffix}"
-            new_path = save_path / new_name
+            new_name = entry.relative_path.parent / build_name(entry, idx)
             
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, shutil.copy2, file, new_path)
+            # Run I/O in executor to not block event loop
+            with metrics.stage("write"):
+                await loop.run_in_executor(executor, self._write_entry, writer, entry, new_name)
+            metrics.count("images")
+            metrics.count("bytes_written", entry.size)
+            
+            if profiler:
+                await profiler.step()
         
-        print(f"Rename complete! Processed {total} files")
-                
-    def skip_duplicates(self, load_path: Path) -> Set[Path]:
+        return idx
+    
+    def _is_valid(self, entry: ScanEntry) -> bool:
+        with entry.open() as file:
+            return is_image(file)
+    
+    def _write_entry(self, writer: OutputWriter, entry: ScanEntry, new_name: PurePosixPath):
+        # Archive members are already in memory, files are copied without reading them here
+        if entry.data is not None:
+            return writer.write(new_name, entry.data)
+        return writer.write_file(new_name, entry.path)
+    
+    def skip_duplicates(self, load_path: Path, recursive: bool = False) -> Set[Path]:
         if self._duplicates_cache is not None:
             return self._duplicates_cache
         
-        dif = difPy.build(str(load_path), recursive=False)
+        # difPy pulls in numpy and its image stack, only load it when dedup is requested
+        import difPy
+        
+        dif = difPy.build(str(load_path), recursive=recursive)
         search = difPy.search(dif)
         
         duplicates = set()
@@ -79,12 +176,5 @@ class RenameService:
         self._duplicates_cache = duplicates
         return duplicates
     
-    def get_valid_files(self, load_path: Path, skip_duplicates: bool = False):
-        duplicates = self.skip_duplicates(load_path) if skip_duplicates else set()
-        
-        for file in load_path.iterdir():
-            if file.is_file() and is_image(file) and file not in duplicates:
-                yield file
-    
     def clear_cache(self):
-        self._duplicates_cache = None
\ No newline at end of file
+        self._duplicates_cache = None
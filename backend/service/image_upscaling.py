@@ -1,47 +1,99 @@
 from spandrel import ModelLoader
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from PIL import Image
-from typing import Optional, Callable, Awaitable
+from typing import Deque, List, Optional, Callable, Awaitable, Tuple, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import torchvision.transforms as transforms
 import numpy as np
 import asyncio
+import gc
+import io
+import os
 from tiler import Tiler, Merger
-from config.image_formats import SUPPORTED_OUTPUT_FORMATS, SUPPORTED_INPUT_EXTENSIONS
+from config.image_formats import (
+    SUPPORTED_OUTPUT_FORMATS,
+    SUPPORTED_INPUT_EXTENSIONS,
+    DEFAULT_ENCODER_PROFILE,
+    get_encoder_options,
+)
+from utils.scanner import DatasetScanner, ScanEntry
+from utils.shards import OutputWriter, open_output
+from utils.decode_cache import DecodeCache
+from utils.tile_planner import TilePlan, plan_tiles
+from utils.batching import BucketBatcher
+from utils.memory import MemoryMonitor
+from utils.metrics import JobMetrics
+from utils.profiling import JobProfiler
+from .base import CancellationToken
+from .upscale_backends import get_upscale_backend
 
 # Type alias for async progress callback
 ProgressCallback = Callable[[int, int, str], Awaitable[None]]
 
 class ImageUpscaleService:
     
-    def __init__(self, device, model_path: Path, tile_size: int = 512, tile_overlap: int = 16):
+    def __init__(
+        self,
+        device,
+        model_path: Path,
+        tile_size: int = 512,
+        tile_overlap: int = 16,
+        encode_workers: Optional[int] = None,
+        backend: str = "pytorch"
+    ):
         self.model_path = model_path
         self.device = device
         self.tile_size = tile_size
         self.overlap = tile_overlap
         
+        # PIL releases the GIL while encoding, so outputs encode in parallel with inference
+        self.encode_workers = encode_workers or min(4, os.cpu_count() or 1)
+        self._encode_executor = ThreadPoolExecutor(max_workers=self.encode_workers, thread_name_prefix="encode")
+        
         loader = ModelLoader()
         model_descriptor = loader.load_from_file(model_path)
         self.model = model_descriptor.model.to(device).eval()
+        # Tiles are planned per image and padded to what the architecture accepts
+        self.size_multiple = model_descriptor.size_requirements.multiple_of
         self.scale = model_descriptor.scale
+        # Tiling, batching and encoding are shared, only the forward pass differs per backend
+        self.backend = get_upscale_backend(backend)(self.model, model_path, self.size_multiple)
+        if not self.backend.needs_model:
+            # Only scale and size_multiple are needed from here on, the eager weights would double memory
+            self.model = None
+            gc.collect()
         
         print(f"Model: {model_path.name}")
         print(f"Scale: {self.scale}x")
-        print(f"Tiling: {tile_size}px tiles with {tile_overlap}px overlap")
+        print(f"Backend: {self.backend.name}")
+        print(f"Tiling: up to {tile_size}x{tile_size}px tiles with {tile_overlap}px overlap")
         print(f"Tiling support: {model_descriptor.tiling}")
         
     
-    def _process_tile(self, tile_pil):
-        to_tensor = transforms.ToTensor()
-        tile_tensor = to_tensor(tile_pil).unsqueeze(0).to(self.device)
+    @property
+    def loaded(self) -> bool:
+        # The backend outlives self.model when it keeps its own copy of the weights
+        return self.backend is not None
+    
+    def _process_tile(self, tile_pil, metrics: Optional[JobMetrics] = None):
+        metrics = metrics or JobMetrics("upscale")
         
-        with torch.no_grad():
-            result = self.model(tile_tensor)
+        with metrics.stage("preprocess"):
+            to_tensor = transforms.ToTensor()
+            tile_tensor = to_tensor(tile_pil).unsqueeze(0).to(self.device)
         
-        result = torch.clamp(result, 0, 1)
+        with metrics.stage("inference"):
+            with torch.no_grad():
+                result = self.backend(tile_tensor)
+            self._synchronize()
         
-        to_pil = transforms.ToPILImage()
-        output_img = to_pil(result.cpu().squeeze(0))
+        with metrics.stage("postprocess"):
+            result = torch.clamp(result, 0, 1)
+            
+            to_pil = transforms.ToPILImage()
+            output_img = to_pil(result.cpu().squeeze(0))
         
         #cleanup
         del tile_tensor, result
@@ -49,14 +101,52 @@ class ImageUpscaleService:
             torch.cuda.empty_cache()
         
         return output_img
-        
     
-    def upscale_with_tiler(self, image: Image.Image, progress_callback: Optional[Callable[[int, int], None]] = None):
-        img_array = np.array(image)
+    def _output_bytes(self, plan: TilePlan) -> int:
+        out_values = plan.height * plan.width * self.scale ** 2 * 3
+        if plan.tiles == 1:
+            # float32 model output and its clamped copy
+            return out_values * 4 * 2
+        # Merger keeps float64 sums and weights, merge() returns another float64 copy
+        return out_values * 8 * 3
+    
+    def _synchronize(self):
+        # Kernels run async on CUDA, wait for them so inference time is not billed to postprocess
+        if torch.cuda.is_available() and torch.device(self.device).type == "cuda":
+            torch.cuda.synchronize()
+    
+    def upscale_with_tiler(
+        self,
+        image: Union[Image.Image, np.ndarray],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        metrics: Optional[JobMetrics] = None
+    ):
+        metrics = metrics or JobMetrics("upscale")
+        # Decode cache hits are already uint8 arrays
+        img_array = image if isinstance(image, np.ndarray) else np.array(image)
+        
+        plan = plan_tiles(img_array.shape[0], img_array.shape[1], self.tile_size, self.overlap, self.size_multiple)
+        metrics.count("wasted_pixels", plan.wasted_pixels)
+        # A huge image is refused up front instead of the Merger buffers OOM-killing the backend
+        MemoryMonitor.get_instance().check(
+            self._output_bytes(plan), f"upscaling a {plan.width}x{plan.height} image"
+        )
+        if plan.tiles == 1:
+            # A single tile needs no Tiler/Merger, padding to the architecture's multiple is cropped off again
+            print("Image fits in one tile, upscaling directly")
+            padded = np.pad(
+                img_array, ((0, plan.tile_height - plan.height), (0, plan.tile_width - plan.width), (0, 0))
+            )
+            output = self._direct_upscale(padded, metrics)
+            if not plan.direct:
+                output = output.crop((0, 0, plan.width * self.scale, plan.height * self.scale))
+            return output
         
+        print(f"Tiling: {plan.rows}x{plan.cols} tiles of {plan.tile_width}x{plan.tile_height}px")
         tiler = Tiler(
             data_shape=img_array.shape,
-            tile_shape=(self.tile_size, self.tile_size, 3),
+            tile_shape=(plan.tile_height, plan.tile_width, 3),
             channel_dimension=2,
             overlap=self.overlap
         )
@@ -69,7 +159,7 @@ class ImageUpscaleService:
         
         output_tiler = Tiler(
             data_shape=output_shape,
-            tile_shape=(self.tile_size * self.scale, self.tile_size * self.scale, 3),
+            tile_shape=(plan.tile_height * self.scale, plan.tile_width * self.scale, 3),
             channel_dimension=2,
             overlap=self.overlap * self.scale
         )
@@ -79,17 +169,23 @@ class ImageUpscaleService:
         total_tiles = len(tiler)
         
         for tile_id, tile in tiler(img_array):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            
             tile_img = Image.fromarray(tile.astype(np.uint8))
-            tile_upscaled = self._process_tile(tile_img)
-            upscaled_array = np.array(tile_upscaled)
-            merger.add(tile_id, upscaled_array)
+            tile_upscaled = self._process_tile(tile_img, metrics)
+            with metrics.stage("postprocess"):
+                upscaled_array = np.array(tile_upscaled)
+                merger.add(tile_id, upscaled_array)
+            metrics.count("tiles")
             
             if progress_callback:
                 progress_callback(tile_id + 1, total_tiles)
         
-        result = merger.merge(unpad=True)
-        result = np.clip(result, 0, 255)
-        result_img = Image.fromarray(result.astype(np.uint8))
+        with metrics.stage("postprocess"):
+            result = merger.merge(unpad=True)
+            result = np.clip(result, 0, 255)
+            result_img = Image.fromarray(result.astype(np.uint8))
         
         return result_img
     
@@ -99,58 +195,236 @@ class ImageUpscaleService:
         save_path: Path,
         output_format: str = "jpg",
         use_tiling: bool = True,
-        progress_callback: Optional[ProgressCallback] = None
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        scan_options: Optional[dict] = None,
+        metrics: Optional[JobMetrics] = None,
+        profiler: Optional[JobProfiler] = None,
+        encoder_profile: str = DEFAULT_ENCODER_PROFILE,
+        shard_options: Optional[dict] = None,
+        decode_cache: Optional[DecodeCache] = None,
+        batch_size: int = 1,
+        batch_wait_s: float = 2.0
     ):
+        metrics = metrics or JobMetrics("upscale")
         save_path.mkdir(parents=True, exist_ok=True)
+        writer = open_output(save_path, "upscale", shard_options)
         
-        files = [f for f in load_path.iterdir() 
-                if f.is_file() and f.suffix.lower() in SUPPORTED_INPUT_EXTENSIONS]
-        
+        # Streams entries as they are found, total grows until the scan is done
+        scanner = DatasetScanner(load_path, extensions=SUPPORTED_INPUT_EXTENSIONS, **(scan_options or {}))
         format_info = SUPPORTED_OUTPUT_FORMATS[output_format.lower()]
-        total = len(files)
+        encoder_options = get_encoder_options(output_format, encoder_profile)
         
-        print(f"\nFound {total} images to process")
+        print(f"\nScanning {load_path} for images to process")
+        print(f"Encoder profile: {encoder_profile} {encoder_options}")
+        
+        # Images that fit in one tile are grouped by size and upscaled as one batch
+        batcher = None
+        if batch_size > 1:
+            batcher = BucketBatcher(batch_size, batch_wait_s)
+            print(f"Batching: up to {batch_size} same-size images per pass, {batch_wait_s}s max wait")
         print("=" * 60)
         
-        for idx, img_file in enumerate(files, 1):
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            idx = await self._upscale_entries(
+                scanner, writer, format_info, encoder_options, use_tiling,
+                pending, progress_callback, cancel_token, metrics, profiler, decode_cache, batcher
+            )
+            while pending:
+                await pending.popleft()
+        finally:
+            # Outputs already handed to the encoders are always finished, never left half written
+            if pending:
+                await asyncio.wait(pending)
+            writer.close()
+            if decode_cache:
+                decode_cache.flush()
+        
+        metrics.record("scan", scanner.scan_seconds)
+        print("\n" + "=" * 60)
+        print(f"Complete! Processed {idx} images")
+    
+    async def _upscale_entries(
+        self,
+        scanner: DatasetScanner,
+        writer: OutputWriter,
+        format_info: dict,
+        encoder_options: dict,
+        use_tiling: bool,
+        pending: Deque[asyncio.Future],
+        progress_callback: Optional[ProgressCallback],
+        cancel_token: Optional[CancellationToken],
+        metrics: JobMetrics,
+        profiler: Optional[JobProfiler],
+        decode_cache: Optional[DecodeCache],
+        batcher: Optional[BucketBatcher]
+    ) -> int:
+        loop = asyncio.get_event_loop()
+        
+        async def queue_output(entry: ScanEntry, output: Image.Image):
+            executor = profiler.executor if profiler else None
+            out_name = entry.relative_path.parent / (entry.path.stem + format_info["extension"])
+            pending.append(loop.run_in_executor(
+                executor or self._encode_executor,
+                self._save_output, output, writer, out_name, format_info["pil_format"], metrics, encoder_options
+            ))
+            
+            # Bound the decoded outputs held in memory while they wait for an encoder
+            while len(pending) > self.encode_workers * 2:
+                await pending.popleft()
+        
+        async def run_batches(batches: List[List[Tuple[ScanEntry, np.ndarray]]]):
+            for batch in batches:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                
+                executor = profiler.executor if profiler else None
+                print(f"Batch of {len(batch)} images at {batch[0][1].shape[1]}x{batch[0][1].shape[0]}px")
+                outputs = await loop.run_in_executor(
+                    executor, self._upscale_batch, [image for _, image in batch], metrics
+                )
+                for (entry, _), output in zip(batch, outputs):
+                    await queue_output(entry, output)
+        
+        idx = 0
+        # A slow scan would otherwise hold a partial bucket until the next image arrives
+        async for entry in scanner.entries(batcher.time_left if batcher else None):
+            if entry is None:
+                await run_batches(batcher.expired())
+                continue
+            
+            idx += 1
+            img_file = entry.path
+            
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            
             if progress_callback:
-                await progress_callback(idx, total, f"Upscaling {img_file.name}")
+                await progress_callback(idx, scanner.total, f"Upscaling {img_file.name}")
             
             print(f"\nProcessing: {img_file.name}")
             
-            # Run CPU/GPU-bound work in executor
-            loop = asyncio.get_event_loop()
-            image = await loop.run_in_executor(None, Image.open, img_file)
-            
-            # Convert color mode if needed
-            if image.mode == "RGBA":
-                print("Converting RGBA to RGB")
-                image = image.convert('RGB')
-            elif image.mode != "RGB":
-                image = image.convert('RGB')
+            # Run CPU/GPU-bound work in executor, profiled jobs use the profiler's worker thread
+            executor = profiler.executor if profiler else None
+            image = await loop.run_in_executor(executor, self._load_image, entry, metrics, decode_cache)
+            metrics.count("bytes_read", entry.size)
             
-            if use_tiling:
-                output = await loop.run_in_executor(None, self.upscale_with_tiler, image)
+            if batcher and self._batchable(image):
+                pixels = np.asarray(image)
+                await run_batches(batcher.add(pixels.shape, (entry, pixels)))
             else:
-                print("Direct upscaling (no tiling)")
-                output = await loop.run_in_executor(None, self._direct_upscale, image)
+                if use_tiling:
+                    output = await loop.run_in_executor(executor, self.upscale_with_tiler, image, None, cancel_token, metrics)
+                else:
+                    print("Direct upscaling (no tiling)")
+                    output = await loop.run_in_executor(executor, self._direct_upscale, image, metrics)
+                await queue_output(entry, output)
+                
+                if batcher:
+                    await run_batches(batcher.expired())
             
-            out_path = save_path / (img_file.stem + format_info["extension"])
-            await loop.run_in_executor(None, output.save, out_path, format_info["pil_format"])
-            print(f"Saved: {out_path}")
+            if profiler:
+                await profiler.step()
         
-        print("\n" + "=" * 60)
-        print(f"Complete! Processed {total} images")
+        if batcher:
+            await run_batches(batcher.drain())
+        
+        return idx
+    
+    def _batchable(self, image: Union[Image.Image, np.ndarray]) -> bool:
+        height, width = image.shape[:2] if isinstance(image, np.ndarray) else (image.height, image.width)
+        return plan_tiles(height, width, self.tile_size, self.overlap, self.size_multiple).direct
+    
+    def _upscale_batch(self, images: List[np.ndarray], metrics: Optional[JobMetrics] = None) -> List[Image.Image]:
+        metrics = metrics or JobMetrics("upscale")
+        
+        with metrics.stage("preprocess"):
+            # Same scaling as ToTensor, one NCHW tensor for the whole bucket
+            batch = torch.from_numpy(np.stack(images)).to(self.device)
+            batch = batch.permute(0, 3, 1, 2).float().div_(255)
+        
+        with metrics.stage("inference"):
+            with torch.no_grad():
+                result = self.backend(batch)
+            self._synchronize()
+        
+        with metrics.stage("postprocess"):
+            # Same conversion as ToPILImage on the single image path
+            result = torch.clamp(result, 0, 1).mul(255).byte().permute(0, 2, 3, 1).cpu().numpy()
+            outputs = [Image.fromarray(frame) for frame in result]
+        metrics.count("batches")
+        
+        del batch, result
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        
+        return outputs
     
-    def _direct_upscale(self, image: Image.Image):
-        to_tensor = transforms.ToTensor()
-        img_tensor = to_tensor(image).unsqueeze(0).to(self.device)
+    def _load_image(
+        self,
+        entry: ScanEntry,
+        metrics: JobMetrics,
+        decode_cache: Optional[DecodeCache] = None
+    ) -> Union[Image.Image, np.ndarray]:
+        if decode_cache:
+            return decode_cache.get_or_decode(entry, lambda: self._decode_image(entry, metrics), metrics)
+        return self._decode_image(entry, metrics)
         
-        with torch.no_grad():
-            result = self.model(img_tensor)
+    def _decode_image(self, entry: ScanEntry, metrics: JobMetrics) -> Image.Image:
+        with entry.open() as file:
+            # Image.open only parses the header, pixels are decoded by convert/load
+            with metrics.stage("validate"):
+                image = Image.open(file)
+            
+            with metrics.stage("decode"):
+                # Convert color mode if needed
+                if image.mode == "RGBA":
+                    print("Converting RGBA to RGB")
+                    image = image.convert('RGB')
+                elif image.mode != "RGB":
+                    image = image.convert('RGB')
+                else:
+                    image.load()
         
-        to_pil = transforms.ToPILImage()
-        output = to_pil(result.cpu().squeeze(0))
+        return image
+    
+    def _save_output(
+        self,
+        output: Image.Image,
+        writer: OutputWriter,
+        out_name: PurePosixPath,
+        pil_format: str,
+        metrics: Optional[JobMetrics] = None,
+        encoder_options: Optional[dict] = None
+    ):
+        metrics = metrics or JobMetrics("upscale")
+        
+        with metrics.stage("encode"):
+            buffer = io.BytesIO()
+            output.save(buffer, pil_format, **(encoder_options or {}))
+        
+        with metrics.stage("write"):
+            saved = writer.write(out_name, buffer.getbuffer())
+        metrics.count("bytes_written", buffer.tell())
+        metrics.count("images")
+        print(f"Saved: {saved}")
+    
+    def _direct_upscale(self, image: Union[Image.Image, np.ndarray], metrics: Optional[JobMetrics] = None):
+        metrics = metrics or JobMetrics("upscale")
+        
+        with metrics.stage("preprocess"):
+            to_tensor = transforms.ToTensor()
+            img_tensor = to_tensor(image).unsqueeze(0).to(self.device)
+        
+        with metrics.stage("inference"):
+            with torch.no_grad():
+                result = self.backend(img_tensor)
+            self._synchronize()
+        
+        with metrics.stage("postprocess"):
+            to_pil = transforms.ToPILImage()
+            output = to_pil(result.cpu().squeeze(0))
         
         # Explicit cleanup
         del img_tensor, result
@@ -160,9 +434,16 @@ class ImageUpscaleService:
         return output
     
     def cleanup(self):
+        if getattr(self, 'backend', None) is not None:
+            self.backend.cleanup()
+            self.backend = None
+        
         if hasattr(self, 'model') and self.model is not None:
             del self.model
             self.model = None
         
+        # Outputs already queued still finish encoding
+        self._encode_executor.shutdown(wait=False)
+        
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
\ No newline at end of file
@@ -1,20 +1,41 @@
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from pathlib import Path
-from .image_captioning import ImageCaptioningService
-from .image_upscaling import ImageUpscaleService
-from utils.image_util import get_device
-import torch
 import gc
+import sys
+from utils.memory import GB, gpu_memory, module_bytes, path_bytes
+
+# torch, transformers and spandrel are imported on first use so the API starts fast
+if TYPE_CHECKING:
+    import torch
+    from .image_captioning import ImageCaptioningService
+    from .image_upscaling import ImageUpscaleService
+
+# Weights plus load-time copies (fp32 -> bf16 casts, state dict and module both alive) in host RAM
+MODEL_LOAD_FACTOR = 1.2
+# On CUDA the weights stream to the GPU, host RAM only holds shards in flight
+MODEL_LOAD_FACTOR_CUDA = 0.25
+# Activations, decoded images and encoder buffers of a running job on top of the weights
+CAPTION_WORKING_SET = 1 * GB
+UPSCALE_WORKING_SET = 1 * GB
+# Tiled output of the largest catalogued image per input pixel: float64 Merger sums, weights and merged copy at 4x
+UPSCALE_BYTES_PER_PIXEL = 4 ** 2 * 3 * 8 * 3
 
 class ServiceManager:
     _instance: Optional['ServiceManager'] = None
     
     def __init__(self):
-        self._caption_service: Optional[ImageCaptioningService] = None
+        self._caption_service: Optional["ImageCaptioningService"] = None
         self._caption_model_path: Optional[Path] = None
         self._caption_model_loaded: bool = False
-        self._upscale_service: Optional[ImageUpscaleService] = None
-        self._device = get_device()
+        self._upscale_service: Optional["ImageUpscaleService"] = None
+        self._device: Optional["torch.device"] = None
+    
+    @property
+    def device(self) -> "torch.device":
+        if self._device is None:
+            from utils.image_util import get_device
+            self._device = get_device()
+        return self._device
     
     @classmethod
     def get_instance(cls):
@@ -28,7 +49,10 @@ class ServiceManager:
         max_new_tokens: int = 512,
         temperature: float = 0.6,
         top_p: float = 0.9,
-    ) -> ImageCaptioningService:
+        quantize: Optional[bool] = None,
+    ) -> "ImageCaptioningService":
+        from .image_captioning import ImageCaptioningService
+        
         model_cleaned_up = (
             self._caption_service is not None and
             (self._caption_service._model is None or self._caption_service._processor is None)
@@ -37,6 +61,7 @@ class ServiceManager:
         needs_new_service = (
             self._caption_service is None or 
             self._caption_model_path != model_path or
+            self._caption_service.quantize != ImageCaptioningService.resolve_quantize(quantize) or
             model_cleaned_up
         )
         
@@ -50,6 +75,7 @@ class ServiceManager:
                 max_new_tokens=max_new_tokens,
                 temperature=temperature,
                 top_p=top_p,
+                quantize=quantize,
             )
             self._caption_model_path = model_path
         return self._caption_service
@@ -96,34 +122,80 @@ class ServiceManager:
         gc.collect()
         
         # Clear GPU cache
-        if torch.cuda.is_available():
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
             torch.cuda.empty_cache()
             torch.cuda.synchronize()
         
         return self.get_gpu_memory_usage()
     
     def get_gpu_memory_usage(self) -> dict:
-        if torch.cuda.is_available():
-            allocated = torch.cuda.memory_allocated() / (1024 ** 3)  # GB
-            reserved = torch.cuda.memory_reserved() / (1024 ** 3)  # GB
-            total = torch.cuda.get_device_properties(0).total_memory / (1024 ** 3)
-            return {
-                "gpu_memory_allocated_gb": round(allocated, 2),
-                "gpu_memory_reserved_gb": round(reserved, 2),
-                "gpu_memory_total_gb": round(total, 2)
-            }
-        return {"gpu_memory_allocated_gb": 0, "gpu_memory_reserved_gb": 0, "gpu_memory_total_gb": 0}
+        memory = gpu_memory()
+        return {
+            "gpu_memory_allocated_gb": round(memory["allocated_bytes"] / GB, 2),
+            "gpu_memory_reserved_gb": round(memory["reserved_bytes"] / GB, 2),
+            "gpu_memory_total_gb": round(memory["total_bytes"] / GB, 2)
+        }
+    
+    def is_upscale_model_loaded(self, model_path: Path) -> bool:
+        return (
+            self._upscale_service is not None and
+            self._upscale_service.model_path == model_path and
+            self._upscale_service.loaded
+        )
+    
+    def estimate_memory(self, kind: str, model_path: Path, max_pixels: int = 0) -> int:
+        # Host RAM a caption or upscale job adds on top of the current RSS, max_pixels comes from the dataset catalog
+        if kind == "caption":
+            loaded, working_set = self.is_caption_model_loaded(model_path), CAPTION_WORKING_SET
+        else:
+            loaded = self.is_upscale_model_loaded(model_path)
+            working_set = max(UPSCALE_WORKING_SET, max_pixels * UPSCALE_BYTES_PER_PIXEL)
+        if loaded:
+            return working_set
+        
+        factor = MODEL_LOAD_FACTOR_CUDA if self.device.type == "cuda" else MODEL_LOAD_FACTOR
+        return int(path_bytes(model_path) * factor) + working_set
+    
+    def get_model_memory(self) -> dict:
+        caption = self._caption_service
+        upscale = self._upscale_service
+        return {
+            "caption": {
+                "model_path": str(self._caption_model_path) if caption else None,
+                "bytes": module_bytes(caption._model) + module_bytes(caption._assistant) if caption else 0,
+            },
+            "upscale": {
+                "model_path": str(upscale.model_path) if upscale else None,
+                "bytes": upscale.backend.model_bytes() if upscale and upscale.loaded else 0,
+            },
+        }
+    
+    def evict(self, keep: Optional[Path] = None):
+        # Frees the models the next job does not use, they are reloaded on demand
+        if self._caption_service is not None and self._caption_model_path != keep:
+            self.unload_caption_model()
+        if self._upscale_service is not None and self._upscale_service.model_path != keep:
+            self._upscale_service.cleanup()
+            self._upscale_service = None
+            gc.collect()
     
     def get_upscale_service(
         self,
         model_path: Path,
         tile_size: int = 512,
         tile_overlap: int = 16,
-    ) -> ImageUpscaleService:
+        backend: str = "pytorch",
+    ) -> "ImageUpscaleService":
+        from .image_upscaling import ImageUpscaleService
+        from .upscale_backends import get_upscale_backend
+        
+        backend_class = get_upscale_backend(backend)
         needs_new_service = (
             self._upscale_service is None or 
             self._upscale_service.model_path != model_path or
-            self._upscale_service.model is None
+            not self._upscale_service.loaded or
+            self._upscale_service.backend.name != backend
         )
         
         if needs_new_service:
@@ -131,10 +203,11 @@ class ServiceManager:
                 self._upscale_service.cleanup()
             
             self._upscale_service = ImageUpscaleService(
-                device=self._device,
+                device="cpu" if backend_class.cpu_only else self.device,
                 model_path=model_path,
                 tile_size=tile_size,
                 tile_overlap=tile_overlap,
+                backend=backend,
             )
         return self._upscale_service
     
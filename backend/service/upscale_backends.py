@@ -0,0 +1,123 @@
+from pathlib import Path
+from typing import Dict, List, Type
+import hashlib
+import importlib.util
+import os
+import tempfile
+import torch
+from utils.file_util import atomic_output
+from utils.image_util import get_cpu_threads
+from utils.memory import module_bytes
+from .base import UpscaleBackend
+
+# Exported graphs are reused across runs, keyed on the weights file and the exporter
+ONNX_CACHE_DIR = Path(os.environ.get("TRAINKIT_ONNX_CACHE_DIR", Path(tempfile.gettempdir()) / "trainkit" / "onnx-cache"))
+ONNX_OPSET = 17
+# Size of the dummy tile traced at export, height and width stay dynamic
+EXPORT_TILE = 64
+
+
+class TorchBackend(UpscaleBackend):
+    name = "pytorch"
+
+    def __init__(self, model: torch.nn.Module, model_path: Path, size_multiple: int = 1):
+        self.model = model
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        return self.model(batch)
+
+    def model_bytes(self) -> int:
+        return module_bytes(self.model)
+
+    def cleanup(self):
+        self.model = None
+
+
+class OnnxRuntimeBackend(UpscaleBackend):
+    name = "onnxruntime"
+    cpu_only = True
+    needs_model = False
+
+    def __init__(self, model: torch.nn.Module, model_path: Path, size_multiple: int = 1):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The onnxruntime backend needs the onnxruntime package: pip install onnxruntime")
+
+        self.onnx_path = self.export(model, model_path, size_multiple)
+        onnx_path = self.onnx_path
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Tiles run one after another, all threads go to the convolutions of a single tile
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = get_cpu_threads("TRAINKIT_ORT_THREADS")
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        print(f"ONNX Runtime: {onnx_path.name}, {options.intra_op_num_threads} threads")
+
+    @staticmethod
+    def cache_path(model_path: Path) -> Path:
+        stat = model_path.stat()
+        key = hashlib.blake2b(digest_size=12)
+        for part in (str(model_path.resolve()), str(stat.st_size), str(stat.st_mtime_ns), torch.__version__, str(ONNX_OPSET)):
+            key.update(part.encode("utf-8"))
+            key.update(b"\0")
+        return ONNX_CACHE_DIR / f"{model_path.stem}-{key.hexdigest()}.onnx"
+
+    @classmethod
+    def export(cls, model: torch.nn.Module, model_path: Path, size_multiple: int = 1) -> Path:
+        onnx_path = cls.cache_path(model_path)
+        if onnx_path.exists():
+            return onnx_path
+
+        print(f"Exporting {model_path.name} to ONNX, this only happens once per model file...")
+        onnx_path.parent.mkdir(parents=True, exist_ok=True)
+        size = -(-EXPORT_TILE // size_multiple) * size_multiple
+        dummy = torch.rand(1, 3, size, size, device=next(model.parameters()).device)
+        with atomic_output(onnx_path) as tmp_path, torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy,),
+                str(tmp_path),
+                input_names=["input"],
+                output_names=["output"],
+                dynamic_axes={
+                    "input": {0: "batch", 2: "height", 3: "width"},
+                    "output": {0: "batch", 2: "out_height", 3: "out_width"},
+                },
+                opset_version=ONNX_OPSET,
+                dynamo=False,
+            )
+        return onnx_path
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        output = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(output)
+
+    def model_bytes(self) -> int:
+        #The session holds the graph initializers, about the size of the exported file
+        return self.onnx_path.stat().st_size if self.session is not None else 0
+
+    def cleanup(self):
+        self.session = None
+
+
+UPSCALE_BACKENDS: Dict[str, Type[UpscaleBackend]] = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+}
+
+
+def get_upscale_backend(name: str) -> Type[UpscaleBackend]:
+    if name not in UPSCALE_BACKENDS:
+        raise ValueError(f"Unknown upscale backend: {name}, expected one of {', '.join(UPSCALE_BACKENDS)}")
+    return UPSCALE_BACKENDS[name]
+
+
+def list_upscale_backends() -> List[dict]:
+    return [
+        {"name": TorchBackend.name, "available": True},
+        {"name": OnnxRuntimeBackend.name, "available": importlib.util.find_spec("onnxruntime") is not None},
+    ]
@@ -0,0 +1,42 @@
+from pathlib import Path, PurePosixPath
+import asyncio
+import time
+from utils.batching import BucketBatcher
+from utils.scanner import DatasetScanner, ScanEntry
+
+
+class SlowScanner(DatasetScanner):
+    #Stands in for a slow directory walk, the second entry arrives long after the first bucket expired
+    def __iter__(self):
+        for name, delay in (("a.png", 0.0), ("b.png", 0.5)):
+            time.sleep(delay)
+            yield ScanEntry(self.root / name, PurePosixPath(name), 0, 0.0)
+
+
+def test_partial_bucket_flushes_while_the_scan_is_idle(tmp_path: Path):
+    batcher = BucketBatcher(batch_size=4, max_wait_s=0.05)
+    events = []
+
+    async def consume():
+        async for entry in SlowScanner(tmp_path).entries(batcher.time_left):
+            if entry is None:
+                events.extend(("batch", [item.name for item in batch]) for batch in batcher.expired())
+                continue
+            events.append(("entry", entry.name))
+            batcher.add("512x512", entry)
+        events.extend(("batch", [item.name for item in batch]) for batch in batcher.drain())
+
+    asyncio.run(consume())
+    assert events == [("entry", "a.png"), ("batch", ["a.png"]), ("entry", "b.png"), ("batch", ["b.png"])]
+
+
+def test_time_left_follows_the_oldest_bucket():
+    batcher = BucketBatcher(batch_size=2, max_wait_s=10.0)
+    assert batcher.time_left() is None
+    batcher.add("a", 1)
+    batcher.add("b", 2)
+    assert 9.0 < batcher.time_left() <= 10.0
+    batcher.add("a", 3)
+    assert batcher.time_left() > 9.0
+    batcher.drain()
+    assert batcher.time_left() is None
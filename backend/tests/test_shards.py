@@ -0,0 +1,30 @@
+from pathlib import PurePosixPath
+import pytest
+from utils.shards import ShardWriter, iter_archive
+
+
+def write_run(save_path, shard_format, names):
+    writer = ShardWriter(save_path, "upscale", shard_format, max_bytes=8)
+    for name in names:
+        writer.write(PurePosixPath(name), name.encode())
+    writer.close()
+    return writer.shards
+
+
+@pytest.mark.parametrize("shard_format", ["tar", "zip"])
+def test_second_run_keeps_earlier_shards(tmp_path, shard_format):
+    first = write_run(tmp_path, shard_format, ["a.png", "b.png"])
+    second = write_run(tmp_path, shard_format, ["c.png"])
+
+    assert [path.name for path in first] == [f"upscale-000000.{shard_format}", f"upscale-000001.{shard_format}"]
+    assert [path.name for path in second] == [f"upscale-000002.{shard_format}"]
+    members = [str(member.path) for path in first + second for member in iter_archive(path)]
+    assert members == ["a.png", "b.png", "c.png"]
+
+
+def test_numbering_ignores_other_prefixes_and_formats(tmp_path):
+    (tmp_path / "caption-000007.tar").touch()
+    (tmp_path / "upscale-000004.zip").touch()
+    (tmp_path / "upscale-notes.tar").touch()
+
+    assert [path.name for path in write_run(tmp_path, "tar", ["a.png"])] == ["upscale-000000.tar"]
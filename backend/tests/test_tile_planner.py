@@ -0,0 +1,41 @@
+import warnings
+import pytest
+from tiler import Tiler
+from utils.tile_planner import plan_tiles
+
+OVERLAP = 16
+#Thin strips, sides around the overlap and odd lengths that don't divide into tiles evenly
+SIDES = list(range(1, 3 * OVERLAP)) + [97, 511, 513, 839, 1011, 1025, 2436, 3000]
+
+
+@pytest.mark.parametrize("multiple_of", [1, 4, 8])
+def test_every_plan_builds_a_tiler(multiple_of):
+    for height in SIDES:
+        for width in SIDES:
+            plan = plan_tiles(height, width, 512, OVERLAP, multiple_of)
+            assert plan.tile_height % multiple_of == 0 and plan.tile_width % multiple_of == 0
+            assert plan.tile_height >= height or plan.rows > 1
+            assert plan.tile_width >= width or plan.cols > 1
+            if plan.tiles == 1:
+                #Upscaled without a Tiler, padded up to the tile
+                continue
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                tiler = Tiler(
+                    data_shape=(height, width, 3),
+                    tile_shape=(plan.tile_height, plan.tile_width, 3),
+                    channel_dimension=2,
+                    overlap=OVERLAP,
+                )
+            assert len(tiler) == plan.tiles, (height, width, plan)
+
+
+def test_strips_thinner_than_the_overlap_are_one_tile():
+    for height, width in [(16, 3000), (7, 2436), (3000, 16)]:
+        plan = plan_tiles(height, width, 512, OVERLAP)
+        assert plan.tiles == 1
+        assert (plan.tile_height, plan.tile_width) == (height, width)
+
+    plan = plan_tiles(14, 839, 512, OVERLAP, multiple_of=8)
+    assert plan.tiles == 1 and (plan.tile_height, plan.tile_width) == (16, 840)
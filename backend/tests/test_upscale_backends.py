@@ -0,0 +1,45 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+spandrel = pytest.importorskip("spandrel")
+pytest.importorskip("onnxruntime")
+
+from spandrel import ModelLoader
+from spandrel.architectures.Compact import SRVGGNetCompact
+import service.upscale_backends as upscale_backends
+from service.upscale_backends import OnnxRuntimeBackend, TorchBackend
+
+#uint8 levels, fp32 convolutions in ORT and torch round differently near the .5 boundaries
+TOLERANCE = 2
+
+
+def to_uint8(batch: "torch.Tensor") -> "torch.Tensor":
+    #Same conversion as the upscale service postprocess
+    return torch.clamp(batch, 0, 1).mul(255).byte()
+
+
+def test_onnxruntime_matches_pytorch(tmp_path, monkeypatch):
+    monkeypatch.setattr(upscale_backends, "ONNX_CACHE_DIR", tmp_path / "onnx-cache")
+    torch.manual_seed(0)
+    model_path = tmp_path / "compact.pth"
+    torch.save(SRVGGNetCompact(num_in_ch=3, num_out_ch=3, num_feat=16, num_conv=2, upscale=2).state_dict(), model_path)
+
+    descriptor = ModelLoader().load_from_file(model_path)
+    model = descriptor.model.eval()
+    size_multiple = descriptor.size_requirements.multiple_of
+    #Odd sides and a batch of two, the export traces a square single image tile
+    batch = torch.rand(2, 3, 37, 52)
+
+    torch_backend = TorchBackend(model, model_path, size_multiple)
+    onnx_backend = OnnxRuntimeBackend(model, model_path, size_multiple)
+    with torch.no_grad():
+        expected = to_uint8(torch_backend(batch))
+    actual = to_uint8(onnx_backend(batch))
+
+    assert actual.shape == expected.shape == (2, 3, 74, 104)
+    assert (actual.int() - expected.int()).abs().max().item() <= TOLERANCE
+    assert onnx_backend.onnx_path.parent == tmp_path / "onnx-cache"
+
+    torch_backend.cleanup()
+    onnx_backend.cleanup()
+    assert onnx_backend.model_bytes() == 0
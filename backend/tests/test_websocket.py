@@ -0,0 +1,28 @@
+from core.websocket import ClientSession
+
+
+def log(seq: int) -> dict:
+    return {"type": "log", "message": str(seq), "seq": seq}
+
+
+def test_drop_oldest_keeps_forced_control_events():
+    session = ClientSession(websocket=None, max_queue_size=2, overflow_policy="drop_oldest")
+    session.enqueue({"type": "subscribed", "seq": None}, force=True)
+    session.enqueue(log(1))
+    session.enqueue(log(2))
+    session.enqueue(log(3))
+
+    events = session._drain()
+    assert [event["type"] for event in events[1:]] == ["subscribed", "log"]
+    assert events[2]["seq"] == 3
+    assert events[0]["message"] == "2 log messages dropped (client too slow)"
+
+
+def test_drop_oldest_drops_the_new_event_when_only_control_events_are_queued():
+    session = ClientSession(websocket=None, max_queue_size=1, overflow_policy="drop_oldest")
+    session.enqueue({"type": "gap", "seq": None}, force=True)
+    session.enqueue(log(1))
+
+    events = session._drain()
+    assert [event["type"] for event in events] == ["log", "gap"]
+    assert events[0]["message"] == "1 log messages dropped (client too slow)"
@@ -0,0 +1,50 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import time
+
+
+class BucketBatcher:
+    def __init__(self, batch_size: int, max_wait_s: float = 2.0, max_pending: Optional[int] = None):
+        self.batch_size = max(1, batch_size)
+        self.max_wait_s = max_wait_s
+        #Items held across all buckets, the oldest bucket is flushed early beyond this
+        self.max_pending = max_pending or self.batch_size * 4
+        self.pending = 0
+        #key -> (time the bucket was opened, items), insertion order is age order
+        self._buckets: Dict[Hashable, Tuple[float, List[Any]]] = {}
+
+    def add(self, key: Hashable, item: Any) -> List[List[Any]]:
+        #Returns the batches that are ready to run, full buckets first
+        _, items = self._buckets.setdefault(key, (time.monotonic(), []))
+        items.append(item)
+        self.pending += 1
+
+        ready = []
+        if len(items) >= self.batch_size:
+            ready.append(self._pop(key))
+        while self.pending > self.max_pending:
+            ready.append(self._pop(next(iter(self._buckets))))
+        return ready + self.expired()
+
+    def expired(self) -> List[List[Any]]:
+        #A bucket that waited max_wait_s runs partially filled, latency stays bounded on mixed datasets
+        now = time.monotonic()
+        return [
+            self._pop(key)
+            for key, (opened, _) in list(self._buckets.items())
+            if now - opened >= self.max_wait_s
+        ]
+
+    def time_left(self) -> Optional[float]:
+        #Seconds until the oldest bucket expires, None while nothing is waiting
+        if not self._buckets:
+            return None
+        opened, _ = next(iter(self._buckets.values()))
+        return max(0.0, opened + self.max_wait_s - time.monotonic())
+
+    def drain(self) -> List[List[Any]]:
+        return [self._pop(key) for key in list(self._buckets)]
+
+    def _pop(self, key: Hashable) -> List[Any]:
+        _, items = self._buckets.pop(key)
+        self.pending -= len(items)
+        return items
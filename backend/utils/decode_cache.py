@@ -0,0 +1,221 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+import json
+import os
+import tempfile
+import threading
+import time
+from utils.file_util import atomic_output
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+    from utils.metrics import JobMetrics
+    from utils.scanner import ScanEntry
+
+CACHE_DIR = Path(os.environ.get("TRAINKIT_DECODE_CACHE_DIR", Path(tempfile.gettempdir()) / "trainkit" / "decode-cache"))
+DEFAULT_BUDGET_BYTES = int(os.environ.get("TRAINKIT_DECODE_CACHE_MB", 8192)) * 1024 * 1024
+DEFAULT_SEGMENT_BYTES = 256 * 1024 * 1024
+
+INDEX_NAME = "index.json"
+
+#segment, offset, shape, mode, last_used
+IndexEntry = Tuple[str, int, Tuple[int, ...], str, float]
+
+
+class DecodeCache:
+    _instance = None
+
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_DIR,
+        budget_bytes: int = DEFAULT_BUDGET_BYTES,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+    ):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.segment_bytes = segment_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, IndexEntry] = {}
+        self._segments: Dict[str, int] = {}
+        self._active: Optional[str] = None
+        self._maps: Dict[str, "np.memmap"] = {}
+        #Evicted segments still mapped by a live view cannot be removed on Windows, retried later
+        self._doomed: List[Path] = []
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load_index()
+
+    @classmethod
+    def get_instance(cls) -> "DecodeCache":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def key(entry: "ScanEntry") -> str:
+        #Any change to the source file invalidates its pixels
+        return f"{entry.path}|{entry.mtime}|{entry.size}"
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._segments.values())
+
+    def get(self, entry: "ScanEntry") -> Optional["np.ndarray"]:
+        import numpy as np
+
+        key = self.key(entry)
+        with self._lock:
+            record = self._entries.get(key)
+            if record is None:
+                self.misses += 1
+                return None
+
+            segment, offset, shape, mode, _ = record
+            self._entries[key] = (segment, offset, shape, mode, time.time())
+            self._dirty = True
+            self.hits += 1
+
+            data = self._maps.get(segment)
+            if data is None:
+                #Copy on write: views are writable for torch/PIL without ever touching the file
+                data = self._maps[segment] = np.memmap(self.cache_dir / segment, dtype=np.uint8, mode="c")
+
+        count = int(np.prod(shape))
+        return data[offset:offset + count].reshape(shape).view(np.ndarray)
+
+    def get_or_decode(
+        self,
+        entry: "ScanEntry",
+        decode: Callable[[], "Image.Image"],
+        metrics: "JobMetrics",
+    ) -> Union["np.ndarray", "Image.Image"]:
+        import numpy as np
+
+        #A hit stands in for the decode stage, a miss is timed by decode() itself and stored for the next run
+        start = time.perf_counter()
+        pixels = self.get(entry)
+        if pixels is not None:
+            metrics.record("decode", time.perf_counter() - start)
+            metrics.count("decode_cache_hits")
+            return pixels
+
+        image = decode()
+        self.put(entry, np.asarray(image), image.mode)
+        return image
+
+    def put(self, entry: "ScanEntry", pixels: "np.ndarray", mode: str = "RGB"):
+        import numpy as np
+
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        if pixels.nbytes > min(self.budget_bytes, self.segment_bytes):
+            return
+
+        key = self.key(entry)
+        with self._lock:
+            if key in self._entries:
+                return
+
+            segment = self._segment_for(pixels.nbytes)
+            path = self.cache_dir / segment
+            with open(path, "ab") as file:
+                offset = file.tell()
+                file.write(pixels.data)
+
+            self._segments[segment] = offset + pixels.nbytes
+            self._entries[key] = (segment, offset, tuple(pixels.shape), mode, time.time())
+            #The segment grew, its map is stale
+            self._maps.pop(segment, None)
+            self._dirty = True
+            self._evict()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            index = {
+                "segments": self._segments,
+                "entries": {key: list(record) for key, record in self._entries.items()},
+            }
+            with atomic_output(self.cache_dir / INDEX_NAME) as tmp_path:
+                tmp_path.write_text(json.dumps(index))
+            self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            for segment in list(self._segments):
+                self._drop_segment(segment)
+            self._active = None
+            self._dirty = True
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cache_dir": str(self.cache_dir),
+                "entries": len(self._entries),
+                "segments": len(self._segments),
+                "bytes": self.total_bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _load_index(self):
+        index_path = self.cache_dir / INDEX_NAME
+        try:
+            index = json.loads(index_path.read_text())
+            segments = {
+                name: size for name, size in index["segments"].items()
+                if (self.cache_dir / name).is_file()
+            }
+            entries = {
+                key: (segment, offset, tuple(shape), mode, last_used)
+                for key, (segment, offset, shape, mode, last_used) in index["entries"].items()
+                if segment in segments
+            }
+        except (OSError, ValueError, KeyError):
+            segments, entries = {}, {}
+
+        self._segments = segments
+        self._entries = entries
+
+        #Segments written after the last flush have no index entries, their space is reclaimed
+        if self.cache_dir.is_dir():
+            for path in self.cache_dir.glob("segment-*.bin"):
+                if path.name not in segments:
+                    path.unlink(missing_ok=True)
+
+    def _segment_for(self, nbytes: int) -> str:
+        if self._active is None or self._segments[self._active] + nbytes > self.segment_bytes:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._active = f"segment-{time.time_ns():x}.bin"
+            self._segments[self._active] = 0
+        return self._active
+
+    def _evict(self):
+        #Whole segments are dropped least recently used first, offsets inside live segments never move
+        while self.total_bytes > self.budget_bytes:
+            last_used: Dict[str, float] = {segment: 0.0 for segment in self._segments if segment != self._active}
+            if not last_used:
+                return
+            for segment, _, _, _, used in self._entries.values():
+                if segment in last_used:
+                    last_used[segment] = max(last_used[segment], used)
+            self._drop_segment(min(last_used, key=last_used.get))
+
+    def _drop_segment(self, segment: str):
+        self._segments.pop(segment, None)
+        self._maps.pop(segment, None)
+        self._entries = {key: record for key, record in self._entries.items() if record[0] != segment}
+
+        self._doomed.append(self.cache_dir / segment)
+        remaining = []
+        for path in self._doomed:
+            try:
+                path.unlink(missing_ok=True)
+            except PermissionError:
+                remaining.append(path)
+        self._doomed = remaining
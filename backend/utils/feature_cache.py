@@ -0,0 +1,97 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from utils.file_util import atomic_output
+
+if TYPE_CHECKING:
+    import torch
+    from utils.scanner import ScanEntry
+
+CACHE_DIR = Path(os.environ.get("TRAINKIT_FEATURE_CACHE_DIR", Path(tempfile.gettempdir()) / "trainkit" / "feature-cache"))
+
+_CHUNK_BYTES = 1024 * 1024
+
+
+def content_hash(entry: "ScanEntry") -> str:
+    #Keyed on the bytes, not the path, so renamed or copied images still hit
+    digest = hashlib.blake2b(digest_size=20)
+    if entry.data is not None:
+        digest.update(entry.data)
+    else:
+        with open(entry.path, "rb") as file:
+            for chunk in iter(lambda: file.read(_CHUNK_BYTES), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_key(*parts: str) -> str:
+    #Anything that changes the features (weights path, config, image preprocessing, dtype) goes in here
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    _instance = None
+
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "FeatureCache":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _path(self, model: str, image: str) -> Path:
+        #Two level fan out keeps directories small on large datasets
+        return self.cache_dir / model / image[:2] / f"{image}.safetensors"
+
+    def get(self, model: str, image: str) -> Optional["torch.Tensor"]:
+        from safetensors.torch import load_file
+
+        path = self._path(model, image)
+        try:
+            features = load_file(str(path))["features"]
+        except (OSError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return features
+
+    def put(self, model: str, image: str, features: "torch.Tensor"):
+        from safetensors.torch import save_file
+
+        path = self._path(model, image)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        #Stored in the model dtype (bf16 for the caption models), no float32 blowup
+        with atomic_output(path) as tmp_path:
+            save_file({"features": features.detach().cpu().contiguous()}, str(tmp_path))
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        files = list(self.cache_dir.rglob("*.safetensors")) if self.cache_dir.is_dir() else []
+        with self._lock:
+            return {
+                "cache_dir": str(self.cache_dir),
+                "models": len({path.parent.parent.name for path in files}),
+                "entries": len(files),
+                "bytes": sum(path.stat().st_size for path in files),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
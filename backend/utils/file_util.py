@@ -1,10 +1,30 @@
-from PIL import Image
 from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator
+import os
+import shutil
 
 def is_image(file_path: Path) -> bool:
+    from PIL import Image
+    
     try:
         with Image.open(file_path) as img:
             img.verify()
         return True
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+#Write to a hidden temp file and move it into place, an interrupted write never leaves a partial output
+@contextmanager
+def atomic_output(file_path: Path) -> Iterator[Path]:
+    tmp_path = file_path.with_name(f".{file_path.name}.part")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, file_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def copy_file(src: Path, dst: Path):
+    with atomic_output(dst) as tmp_path:
+        shutil.copy2(src, tmp_path)
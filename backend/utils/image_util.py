@@ -1,10 +1,21 @@
 import torch
+import os
+import psutil
 from pathlib import Path
 from PIL import Image
+from functools import lru_cache
 
+@lru_cache(maxsize=None)
 def get_device() -> torch.device:
     return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
+def get_cpu_threads(env_var: str) -> int:
+    threads = os.environ.get(env_var)
+    if threads:
+        return int(threads)
+    #Physical cores, hyperthreads share the FMA units and slow matmuls and convolutions down
+    return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+
 def convert_to_rgb(image_path: Path) -> Image.Image:
     image = Image.open(image_path)
     
@@ -0,0 +1,165 @@
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+import os
+import sys
+import threading
+import time
+import psutil
+from utils.metrics import MetricsRegistry
+
+if TYPE_CHECKING:
+    import torch
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+#Share of physical RAM jobs may use when TRAINKIT_MEMORY_BUDGET_MB is not set, the rest is left to the OS and the UI
+DEFAULT_BUDGET_FRACTION = 0.85
+SAMPLE_INTERVAL_S = 0.25
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+def default_budget() -> int:
+    budget_mb = os.environ.get("TRAINKIT_MEMORY_BUDGET_MB")
+    if budget_mb:
+        return int(budget_mb) * MB
+    return int(psutil.virtual_memory().total * DEFAULT_BUDGET_FRACTION)
+
+
+def system_memory() -> dict:
+    memory = psutil.virtual_memory()
+    return {"total_bytes": memory.total, "available_bytes": memory.available}
+
+
+def gpu_memory() -> dict:
+    #Nothing can be allocated before torch is imported, don't import it just to report zeros
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        return {
+            "allocated_bytes": torch.cuda.memory_allocated(),
+            "reserved_bytes": torch.cuda.memory_reserved(),
+            "peak_bytes": torch.cuda.max_memory_allocated(),
+            "total_bytes": torch.cuda.get_device_properties(0).total_memory,
+        }
+    return {"allocated_bytes": 0, "reserved_bytes": 0, "peak_bytes": 0, "total_bytes": 0}
+
+
+def module_bytes(module: Optional["torch.nn.Module"]) -> int:
+    if module is None:
+        return 0
+    total = sum(tensor.numel() * tensor.element_size() for tensor in chain(module.parameters(), module.buffers()))
+    #Dynamically quantized layers keep their int8 weights in packed params, not in parameters()
+    for child in module.modules():
+        if hasattr(child, "_packed_params") and callable(getattr(child, "weight", None)):
+            weight = child.weight()
+            total += weight.numel() * weight.element_size()
+    return total
+
+
+def path_bytes(path: Path) -> int:
+    #A weights file, or a model folder (HF checkpoints are a folder of shards)
+    if path.is_file():
+        return path.stat().st_size
+    if path.is_dir():
+        return sum(child.stat().st_size for child in path.rglob("*") if child.is_file())
+    return 0
+
+
+class MemoryMonitor:
+    _instance = None
+
+    def __init__(self, budget_bytes: Optional[int] = None, interval_s: float = SAMPLE_INTERVAL_S):
+        self.budget_bytes = budget_bytes or default_budget()
+        self.interval_s = interval_s
+        self.peak_rss = 0
+        self._process = psutil.Process()
+        #job id -> peak RSS seen while the job ran
+        self._jobs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        registry = MetricsRegistry.get_instance()
+        self._rss_gauge = registry.gauge("trainkit_process_rss_bytes", "Backend resident memory")
+        self._budget_gauge = registry.gauge("trainkit_memory_budget_bytes", "Memory budget jobs are admitted against")
+        self._budget_gauge.set(self.budget_bytes)
+
+    @classmethod
+    def get_instance(cls) -> "MemoryMonitor":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def set_budget(self, budget_bytes: int):
+        if budget_bytes < 1:
+            raise ValueError("Memory budget must be positive")
+        self.budget_bytes = budget_bytes
+        self._budget_gauge.set(budget_bytes)
+
+    def rss(self) -> int:
+        return self._process.memory_info().rss
+
+    def sample(self) -> int:
+        rss = self.rss()
+        self._rss_gauge.set(rss)
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            for job_id, peak in self._jobs.items():
+                self._jobs[job_id] = max(peak, rss)
+        return rss
+
+    def track(self, job_id: str):
+        rss = self.rss()
+        with self._lock:
+            self._jobs[job_id] = rss
+            #One sampler thread for all running jobs, it exits when the last one is untracked
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+                self._thread.start()
+
+    def untrack(self, job_id: str) -> int:
+        #Returns the peak RSS while the job ran, a final sample catches a spike right before the end
+        self.sample()
+        with self._lock:
+            return self._jobs.pop(job_id, 0)
+
+    def _sample_loop(self):
+        while True:
+            with self._lock:
+                if not self._jobs:
+                    self._thread = None
+                    return
+            self.sample()
+            time.sleep(self.interval_s)
+
+    def headroom(self, reserved: int = 0) -> int:
+        #Bounded by the budget and by what the OS can actually still hand out
+        return min(self.budget_bytes - self.rss(), psutil.virtual_memory().available) - reserved
+
+    def fits(self, estimate: int, reserved: int = 0) -> bool:
+        return estimate <= self.headroom(reserved)
+
+    def check(self, estimate: int, what: str, reserved: int = 0):
+        headroom = self.headroom(reserved)
+        if estimate > headroom:
+            raise MemoryBudgetExceeded(
+                f"Not enough memory: {what} needs about {estimate / GB:.1f} GB but only "
+                f"{max(headroom, 0) / GB:.1f} GB of the {self.budget_bytes / GB:.1f} GB budget is free"
+            )
+
+    def snapshot(self) -> dict:
+        rss = self.sample()
+        with self._lock:
+            jobs = dict(self._jobs)
+        return {
+            "rss_bytes": rss,
+            "peak_rss_bytes": self.peak_rss,
+            "budget_bytes": self.budget_bytes,
+            "headroom_bytes": self.headroom(),
+            "system": system_memory(),
+            "gpu": gpu_memory(),
+            "running_jobs_peak_rss_bytes": jobs,
+        }
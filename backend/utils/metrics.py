@@ -0,0 +1,201 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+#Stages timed by the processing services, in pipeline order
+STAGES = ("scan", "validate", "decode", "preprocess", "inference", "postprocess", "encode", "write")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        #Per label set: bucket counts (non cumulative), sum, count
+        self._values: Dict[LabelKey, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][idx] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    _instance = None
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "MetricsRegistry":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def counter(self, name: str, description: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Gauge(name, description)
+            return self._metrics[name]
+
+    def histogram(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class JobMetrics:
+    def __init__(self, service: str, registry: Optional[MetricsRegistry] = None):
+        self.service = service
+        self.registry = registry or MetricsRegistry.get_instance()
+        self.started_at = time.perf_counter()
+        self._stages: Dict[str, List[float]] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stage_histogram = self.registry.histogram(
+            "trainkit_stage_seconds", "Time spent per processing stage"
+        )
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        self._stage_histogram.observe(seconds, service=self.service, stage=stage)
+        with self._lock:
+            state = self._stages.get(stage)
+            if state is None:
+                state = self._stages[stage] = [0, 0.0, 0.0]
+            state[0] += 1
+            state[1] += seconds
+            state[2] = max(state[2], seconds)
+
+    def count(self, name: str, amount: float = 1):
+        self.registry.counter(f"trainkit_{name}_total", f"Total {name.replace('_', ' ')} processed").inc(
+            amount, service=self.service
+        )
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": count,
+                    "total_s": round(total, 4),
+                    "mean_s": round(total / count, 4) if count else 0,
+                    "max_s": round(longest, 4),
+                }
+                for stage, (count, total, longest) in sorted(
+                    self._stages.items(),
+                    key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES)
+                )
+            }
+            counters = dict(self._counters)
+        return {
+            "service": self.service,
+            "wall_s": round(time.perf_counter() - self.started_at, 4),
+            "stages": stages,
+            "counters": counters,
+        }
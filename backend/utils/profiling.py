@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import cProfile
+import os
+import tempfile
+import time
+
+TRACE_DIR = Path(os.environ.get("TRAINKIT_TRACE_DIR", Path(tempfile.gettempdir()) / "trainkit" / "traces"))
+
+#torch: torch.profiler chrome trace, cprofile: pstats dump for the pure Python paths
+PROFILER_MODES = ("torch", "cprofile")
+
+
+class JobProfiler:
+    def __init__(self, job_id: str, kind: str, mode: str = "torch", max_images: int = 5, trace_dir: Path = TRACE_DIR):
+        if mode not in PROFILER_MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+
+        self.job_id = job_id
+        self.kind = kind
+        self.mode = mode
+        self.max_images = max(1, max_images)
+        self.trace_dir = trace_dir
+        self.images = 0
+        self.trace_path: Optional[Path] = None
+        self._profiler = None
+        self._active = False
+        #Profilers only see the thread that enabled them, so profiled work runs on one dedicated worker
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"profile-{job_id}")
+
+    @property
+    def executor(self) -> Optional[ThreadPoolExecutor]:
+        #Once the image limit is reached work goes back to the default executor
+        return self._executor if self._active else None
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self._start)
+        self._active = True
+
+    async def step(self):
+        self.images += 1
+        if self._active and self.images >= self.max_images:
+            await self.stop()
+
+    async def stop(self) -> Optional[Path]:
+        if self._active:
+            self._active = False
+            loop = asyncio.get_event_loop()
+            self.trace_path = await loop.run_in_executor(self._executor, self._stop)
+            self._executor.shutdown(wait=False)
+        return self.trace_path
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.mode,
+            "images_profiled": min(self.images, self.max_images),
+            "trace": self.trace_path.name if self.trace_path else None,
+        }
+
+    def _start(self):
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            return
+
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        self._profiler = profile(activities=activities, record_shapes=True, profile_memory=True)
+        self._profiler.start()
+
+    def _stop(self) -> Path:
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.kind}-{time.strftime('%Y%m%d-%H%M%S')}-{self.job_id}"
+
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            trace_path = self.trace_dir / f"{stem}.prof"
+            self._profiler.dump_stats(str(trace_path))
+        else:
+            self._profiler.stop()
+            trace_path = self.trace_dir / f"{stem}.json"
+            self._profiler.export_chrome_trace(str(trace_path))
+
+        self._profiler = None
+        print(f"Profiler trace saved to: {trace_path}")
+        return trace_path
+
+
+def list_traces(trace_dir: Path = TRACE_DIR) -> List[dict]:
+    if not trace_dir.is_dir():
+        return []
+    traces = [path for path in trace_dir.iterdir() if path.is_file() and path.suffix in (".json", ".prof")]
+    traces.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    return [
+        {"name": path.name, "size": path.stat().st_size, "created_at": path.stat().st_mtime}
+        for path in traces
+    ]
+
+
+def get_trace_path(name: str, trace_dir: Path = TRACE_DIR) -> Optional[Path]:
+    #Only bare file names inside the trace directory can be downloaded
+    if Path(name).name != name:
+        return None
+    path = trace_dir / name
+    return path if path.is_file() else None
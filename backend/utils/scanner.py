@@ -0,0 +1,224 @@
+from pathlib import Path, PurePosixPath
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, Iterator, List, Optional, Set
+import asyncio
+import fnmatch
+import io
+import os
+import re
+import threading
+import time
+from utils.shards import is_archive, iter_archive
+
+_DIGITS = re.compile(r"(\d+)")
+_END = object()
+
+#Archive entries hold their bytes while buffered, keep fewer of them in flight
+ARCHIVE_BUFFER_SIZE = 32
+
+
+class ScanEntry:
+    __slots__ = ("path", "relative_path", "size", "mtime", "data")
+
+    def __init__(
+        self,
+        path: Path,
+        relative_path: PurePosixPath,
+        size: int,
+        mtime: float,
+        data: Optional[bytes] = None,
+    ):
+        #Archive members carry their bytes and a virtual path inside the shard, files are read from path
+        self.path = path
+        self.relative_path = relative_path
+        self.size = size
+        self.mtime = mtime
+        self.data = data
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def open(self) -> BinaryIO:
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, "rb")
+
+
+def natural_key(name: str):
+    return [int(token) if token.isdigit() else token.lower() for token in _DIGITS.split(name)]
+
+
+def _matches(relative: str, name: str, patterns: Iterable[str]) -> bool:
+    #Patterns with a slash match the relative path, others only the name
+    return any(
+        fnmatch.fnmatch(relative if "/" in pattern else name, pattern)
+        for pattern in patterns
+    )
+
+
+def scan_dataset(
+    root: Path,
+    recursive: bool = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    extensions: Optional[Set[str]] = None,
+    natural_sort: bool = False,
+) -> Iterator[ScanEntry]:
+    stack = [(root, PurePosixPath())]
+
+    while stack:
+        directory, relative_dir = stack.pop()
+        subdirs = []
+
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda e: natural_key(e.name)) if natural_sort else it
+            for entry in entries:
+                relative = relative_dir / entry.name
+
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not (exclude and _matches(relative.as_posix(), entry.name, exclude)):
+                        subdirs.append((Path(entry.path), relative))
+                    continue
+
+                if not entry.is_file():
+                    continue
+                if extensions is not None and os.path.splitext(entry.name)[1].lower() not in extensions:
+                    continue
+                if include and not _matches(relative.as_posix(), entry.name, include):
+                    continue
+                if exclude and _matches(relative.as_posix(), entry.name, exclude):
+                    continue
+
+                stat = entry.stat()
+                yield ScanEntry(Path(entry.path), relative, stat.st_size, stat.st_mtime)
+
+        #Depth first, pushed in reverse so subdirectories are visited in listing order
+        stack.extend(reversed(subdirs))
+
+
+def scan_archives(
+    root: Path,
+    recursive: bool = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    extensions: Optional[Set[str]] = None,
+    natural_sort: bool = False,
+) -> Iterator[ScanEntry]:
+    if root.is_file():
+        shards = [root]
+    else:
+        shards = (
+            entry.path
+            for entry in scan_dataset(root, recursive=recursive, natural_sort=natural_sort)
+            if is_archive(entry.path)
+        )
+
+    for shard in shards:
+        for member in iter_archive(shard):
+            name = member.path.name
+            if extensions is not None and os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            if include and not _matches(member.path.as_posix(), name, include):
+                continue
+            if exclude and _matches(member.path.as_posix(), name, exclude):
+                continue
+
+            #Filtered members are skipped without being read
+            yield ScanEntry(shard / member.path, member.path, member.size, member.mtime, member.read())
+
+
+class DatasetScanner:
+    def __init__(
+        self,
+        root: Path,
+        recursive: bool = False,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        extensions: Optional[Set[str]] = None,
+        natural_sort: bool = False,
+        shards: bool = False,
+        buffer_size: int = 256,
+    ):
+        self.root = root
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.extensions = extensions
+        self.natural_sort = natural_sort
+        #An archive root is always streamed, a directory only when shards is set
+        self.archived = shards or (root.is_file() and is_archive(root))
+        self.buffer_size = min(buffer_size, ARCHIVE_BUFFER_SIZE) if self.archived else buffer_size
+        self.discovered = 0
+        self.scan_seconds = 0.0
+        self._slots = threading.Semaphore(self.buffer_size)
+        self._stop = threading.Event()
+
+    @property
+    def total(self) -> int:
+        #Grows while the scan is running, final once iteration ends
+        return self.discovered
+
+    def __iter__(self) -> Iterator[ScanEntry]:
+        scan = scan_archives if self.archived else scan_dataset
+        return scan(
+            self.root,
+            recursive=self.recursive,
+            include=self.include,
+            exclude=self.exclude,
+            extensions=self.extensions,
+            natural_sort=self.natural_sort,
+        )
+
+    def _produce(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        try:
+            entries = iter(self)
+            while True:
+                #Only the directory walk counts as scan time, not waiting on a full buffer
+                start = time.perf_counter()
+                entry = next(entries, None)
+                self.scan_seconds += time.perf_counter() - start
+                if entry is None:
+                    break
+
+                while not self._slots.acquire(timeout=0.1):
+                    if self._stop.is_set():
+                        return
+                if self._stop.is_set():
+                    return
+                self.discovered += 1
+                loop.call_soon_threadsafe(queue.put_nowait, entry)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    def __aiter__(self) -> AsyncIterator[ScanEntry]:
+        return self.entries()
+
+    async def entries(self, idle_timeout: Optional[Callable[[], Optional[float]]] = None) -> AsyncIterator[Optional[ScanEntry]]:
+        #idle_timeout gives the seconds to wait for the next entry, None is yielded when it runs out
+        if not (self.root.is_dir() or (self.archived and self.root.is_file())):
+            raise FileNotFoundError(f"Directory not found: {self.root}")
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        #The scan streams from its own thread so processing starts with the first entry
+        producer = threading.Thread(target=self._produce, args=(loop, queue), daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                timeout = idle_timeout() if idle_timeout else None
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                self._slots.release()
+                yield item
+        finally:
+            self._stop.set()
@@ -0,0 +1,201 @@
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterator, List, NamedTuple, Optional, Union
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from utils.file_util import atomic_output, copy_file
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+SHARD_FORMATS = ("tar", "zip")
+DEFAULT_SHARD_MAX_BYTES = 1024 * 1024 * 1024
+
+#Rough per member overhead of a tar header block, only used for the shard size cap
+_TAR_HEADER_BYTES = 512
+
+
+class ArchiveMember(NamedTuple):
+    path: PurePosixPath
+    size: int
+    mtime: float
+    #Only valid until the iterator moves on to the next member
+    read: Callable[[], bytes]
+
+
+def is_archive(path: Path) -> bool:
+    return path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _member_path(name: str) -> Optional[PurePosixPath]:
+    #Members that would escape the output directory are never yielded
+    path = PurePosixPath(name.lstrip("/"))
+    if not path.parts or ".." in path.parts:
+        return None
+    return path
+
+
+def _iter_tar(path: Path) -> Iterator[ArchiveMember]:
+    #Stream mode reads the archive front to back without seeking, compressed tars included
+    with tarfile.open(path, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            member_path = _member_path(member.name)
+            if member_path is None:
+                continue
+            yield ArchiveMember(
+                member_path, member.size, float(member.mtime),
+                lambda member=member: tar.extractfile(member).read()
+            )
+
+
+def _iter_zip(path: Path) -> Iterator[ArchiveMember]:
+    with zipfile.ZipFile(path) as archive:
+        #Central directory order is not guaranteed to be file order, read by offset to stay sequential
+        for info in sorted(archive.infolist(), key=lambda info: info.header_offset):
+            if info.is_dir():
+                continue
+            member_path = _member_path(info.filename)
+            if member_path is None:
+                continue
+            yield ArchiveMember(
+                member_path, info.file_size, time.mktime(info.date_time + (0, 0, -1)),
+                lambda info=info: archive.read(info)
+            )
+
+
+def iter_archive(path: Path) -> Iterator[ArchiveMember]:
+    if path.suffix.lower() == ".zip":
+        return _iter_zip(path)
+    return _iter_tar(path)
+
+
+class DirectoryWriter:
+    def __init__(self, save_path: Path):
+        self.save_path = save_path
+
+    def _target(self, relative: PurePosixPath) -> Path:
+        path = self.save_path.joinpath(*relative.parts)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def write(self, relative: PurePosixPath, data: Union[bytes, memoryview]) -> str:
+        path = self._target(relative)
+        with atomic_output(path) as tmp_path:
+            tmp_path.write_bytes(data)
+        return str(path)
+
+    def write_file(self, relative: PurePosixPath, src: Path) -> str:
+        path = self._target(relative)
+        copy_file(src, path)
+        return str(path)
+
+    def close(self):
+        pass
+
+
+class ShardWriter:
+    def __init__(
+        self,
+        save_path: Path,
+        prefix: str,
+        shard_format: str = "tar",
+        max_bytes: int = DEFAULT_SHARD_MAX_BYTES,
+    ):
+        if shard_format not in SHARD_FORMATS:
+            raise ValueError(f"Unknown shard format: {shard_format}")
+
+        self.save_path = save_path
+        self.prefix = prefix
+        self.shard_format = shard_format
+        self.max_bytes = max(1, max_bytes)
+        self.shards: List[Path] = []
+        self.members = 0
+        self._archive = None
+        self._path: Optional[Path] = None
+        self._tmp_path: Optional[Path] = None
+        self._size = 0
+        #Numbering continues after shards left by earlier runs, so they are never overwritten
+        self._next_index = self._last_index() + 1
+        #Services write from several encode threads, members are appended one at a time
+        self._lock = threading.Lock()
+
+    def write(self, relative: PurePosixPath, data: Union[bytes, memoryview]) -> str:
+        with self._lock:
+            self._reserve(len(data))
+            name = relative.as_posix()
+            if self.shard_format == "tar":
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = time.time()
+                self._archive.addfile(info, io.BytesIO(data))
+            else:
+                #Images are already compressed, members are stored as is
+                self._archive.writestr(zipfile.ZipInfo(name, time.localtime()[:6]), data)
+            return self._added(name, len(data))
+
+    def write_file(self, relative: PurePosixPath, src: Path) -> str:
+        size = src.stat().st_size
+        with self._lock:
+            self._reserve(size)
+            name = relative.as_posix()
+            if self.shard_format == "tar":
+                self._archive.add(src, arcname=name, recursive=False)
+            else:
+                self._archive.write(src, name)
+            return self._added(name, size)
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._close_shard()
+
+    def _reserve(self, size: int):
+        #A shard is only closed once it holds something, an oversized member gets a shard of its own
+        if self._archive is not None and self._size + size > self.max_bytes:
+            self._close_shard()
+        if self._archive is None:
+            self._open_shard()
+
+    def _added(self, name: str, size: int) -> str:
+        self._size += size + (_TAR_HEADER_BYTES if self.shard_format == "tar" else 0)
+        self.members += 1
+        return f"{self._path.name}:{name}"
+
+    def _last_index(self) -> int:
+        last = -1
+        for path in self.save_path.glob(f"{self.prefix}-*.{self.shard_format}"):
+            index = path.name[len(self.prefix) + 1:-len(self.shard_format) - 1]
+            if index.isdigit():
+                last = max(last, int(index))
+        return last
+
+    def _open_shard(self):
+        self.save_path.mkdir(parents=True, exist_ok=True)
+        self._path = self.save_path / f"{self.prefix}-{self._next_index:06d}.{self.shard_format}"
+        self._next_index += 1
+        #Same hidden .part convention as atomic_output, a shard only appears once it is complete
+        self._tmp_path = self._path.with_name(f".{self._path.name}.part")
+        if self.shard_format == "tar":
+            self._archive = tarfile.open(self._tmp_path, mode="w")
+        else:
+            self._archive = zipfile.ZipFile(self._tmp_path, mode="w")
+        self._size = 0
+
+    def _close_shard(self):
+        self._archive.close()
+        self._archive = None
+        os.replace(self._tmp_path, self._path)
+        self.shards.append(self._path)
+        print(f"Shard saved: {self._path}")
+
+
+OutputWriter = Union[DirectoryWriter, ShardWriter]
+
+
+def open_output(save_path: Path, prefix: str, shard_options: Optional[dict] = None) -> OutputWriter:
+    if shard_options:
+        return ShardWriter(save_path, prefix, **shard_options)
+    return DirectoryWriter(save_path)
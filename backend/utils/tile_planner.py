@@ -0,0 +1,104 @@
+from typing import NamedTuple, Optional
+import math
+
+#Extra grid sizes tried past the minimum tile count, more rows can mean far less padding
+_SEARCH_ROWS = 8
+
+
+class TilePlan(NamedTuple):
+    height: int
+    width: int
+    rows: int
+    cols: int
+    tile_height: int
+    tile_width: int
+    overlap: int
+
+    @property
+    def tiles(self) -> int:
+        return self.rows * self.cols
+
+    @property
+    def direct(self) -> bool:
+        #The whole image is one tile with no padding, no Tiler/Merger needed
+        return self.tiles == 1 and self.tile_height == self.height and self.tile_width == self.width
+
+    @property
+    def processed_pixels(self) -> int:
+        return self.tiles * self.tile_height * self.tile_width
+
+    @property
+    def wasted_pixels(self) -> int:
+        #Padding plus overlap that is run through the model more than once
+        return self.processed_pixels - self.height * self.width
+
+    @property
+    def wasted_ratio(self) -> float:
+        return self.wasted_pixels / self.processed_pixels
+
+
+def _align(value: int, multiple: int) -> int:
+    return -(-value // multiple) * multiple
+
+
+def axis_tiles(length: int, tile: int, overlap: int) -> int:
+    #Same count as Tiler: one tile, then steps of tile - overlap until the length is covered
+    if length <= tile:
+        return 1
+    return math.ceil((length - tile) / (tile - overlap)) + 1
+
+
+def fixed_plan(height: int, width: int, tile_size: int = 512, overlap: int = 16) -> TilePlan:
+    #Square tiles of a fixed size, the layout used before tiles were planned per image
+    return TilePlan(
+        height, width,
+        axis_tiles(height, tile_size, overlap), axis_tiles(width, tile_size, overlap),
+        tile_size, tile_size, overlap,
+    )
+
+
+def _fit(length: int, count: int, overlap: int, multiple: int) -> int:
+    #Smallest tile for which count tiles cover the length, spread evenly instead of padding the last one
+    return _align(math.ceil((length + (count - 1) * overlap) / count), multiple)
+
+
+def plan_tiles(
+    height: int,
+    width: int,
+    tile_size: int = 512,
+    overlap: int = 16,
+    multiple_of: int = 1,
+    max_aspect: int = 2,
+) -> TilePlan:
+    #tile_size squared is the memory limit, tiles may be rectangular up to max_aspect times tile_size long
+    max_area = tile_size * tile_size
+    max_side = tile_size * max_aspect
+    multiple_of = max(1, multiple_of)
+    #Tiler cuts no tiles along a side no longer than the overlap, such strips run as one padded tile
+    if min(height, width) <= overlap:
+        return TilePlan(height, width, 1, 1, _align(height, multiple_of), _align(width, multiple_of), overlap)
+    #Tiler also needs every tile side longer than the overlap, a thin image pads up to that instead
+    min_side = _align(overlap + 1, multiple_of)
+
+    best: Optional[TilePlan] = None
+    min_rows = axis_tiles(height, max_side, overlap)
+    for row_count in range(min_rows, min_rows + _SEARCH_ROWS):
+        tile_height = max(_fit(height, row_count, overlap, multiple_of), min_side)
+        if row_count > 1 and tile_height <= 2 * overlap:
+            break
+        if tile_height > max_side:
+            continue
+        rows = axis_tiles(height, tile_height, overlap)
+
+        width_limit = min(max_side, max_area // tile_height) // multiple_of * multiple_of
+        if width_limit < width and width_limit <= 2 * overlap:
+            continue
+        cols = axis_tiles(width, width_limit, overlap)
+        tile_width = max(_fit(width, cols, overlap, multiple_of), min_side)
+        cols = axis_tiles(width, tile_width, overlap)
+
+        plan = TilePlan(height, width, rows, cols, tile_height, tile_width, overlap)
+        if best is None or (plan.processed_pixels, plan.tiles) < (best.processed_pixels, best.tiles):
+            best = plan
+
+    return best or fixed_plan(height, width, tile_size, overlap)
@@ -208,6 +208,10 @@ export function CaptionPanel({
       });
 
       const result = await response.json();
+      if (result.status === "cancelled") {
+        // Already handled by handleCancel
+        return;
+      }
       if (result.error) {
         setStatus("error");
         setErrorMessage(result.error);
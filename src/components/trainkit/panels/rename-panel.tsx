@@ -79,6 +79,10 @@ export function RenamePanel({
       });
 
       const result = await response.json();
+      if (result.status === "cancelled") {
+        // Already handled by handleCancel
+        return;
+      }
       if (result.error) {
         setStatus("error");
         setErrorMessage(result.error);
@@ -193,6 +193,10 @@ export function UpscalePanel({
       });
 
       const result = await response.json();
+      if (result.status === "cancelled") {
+        // Already handled by handleCancel
+        return;
+      }
       if (result.error) {
         setStatus("error");
         setErrorMessage(result.error);
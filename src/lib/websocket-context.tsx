@@ -115,23 +115,36 @@ export function WebSocketProvider({
           addBackendLog("info", "Connected to backend WebSocket");
         };
 
+        // Backend events arrive batched, one frame per flush interval
+        const handleEvent = (data: { type: string; [key: string]: unknown }) => {
+          if (data.type === "progress") {
+            const progressData = data as unknown as ProgressData;
+            // Update
+            setProgress(progressData);
+
+            // Add as log
+            addBackendLog("info", progressData.message);
+
+            // Clear after completion
+            if (
+              progressData.current === progressData.total &&
+              progressData.total > 0
+            ) {
+              setTimeout(() => setProgress(null), 3000);
+            }
+          } else if (data.type === "log") {
+            addBackendLog(data.level as LogLevel, data.message as string);
+          }
+        };
+
         ws.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data);
 
-            if (data.type === "progress") {
-              // Update
-              setProgress(data as ProgressData);
-
-              // Add as log
-              addBackendLog("info", data.message);
-
-              // Clear after completion
-              if (data.current === data.total && data.total > 0) {
-                setTimeout(() => setProgress(null), 3000);
-              }
-            } else if (data.type === "log") {
-              addBackendLog(data.level as LogLevel, data.message);
+            if (data.type === "batch") {
+              data.events.forEach(handleEvent);
+            } else {
+              handleEvent(data);
             }
           } catch {
             addBackendLog("info", event.data);